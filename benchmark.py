@@ -0,0 +1,442 @@
+"""
+Benchmarks for the hot paths of A Wee Bit Miffed Ducks.
+
+Every benchmark builds a synthetic level of a given number of entities and
+times a number of ticks of one part of the game loop:
+
+    update                      main.update() with a duck flying into a level
+                                of planks
+    drop                        Simulation.drop() on the boxes of a random
+                                round made with create_items
+    check_breakable_collision   the duck hitting a plank of a level of planks
+    falling_obstacle            every plank of a level falling onto targets
+    draw                        main.draw() of a level of planks, in Pyglet's
+                                headless mode, and draw_first, the first
+                                frame that builds the scene
+
+Levels of planks are generated as level JSON files into a temporary
+directory and loaded with Simulation.load_level, like the real levels.
+The simulation benchmarks are also run with the NumPy entity stores if
+NumPy is installed, marked as e.g. "falling_obstacle[numpy]".
+
+Each case is run REPEATS times on a fresh level and the fastest and the
+median time per tick are written into a JSON baseline file. Comparing the
+fastest times of a new run to an earlier baseline shows which paths got
+faster or slower:
+
+    python benchmark.py --output benchmarks/baseline.json
+    python benchmark.py --sizes 10 1000 --compare benchmarks/baseline.json
+
+A case that takes longer than the time budget for one repeat isn't run for
+larger sizes, since some paths grow faster than linearly.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+import statistics
+import simulation
+from simulation import WIN_WIDTH, WIN_HEIGHT, GROUND_LEVEL, TICK
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+SIZES = (10, 100, 1000, 10000, 100000)
+REPEATS = 3
+TICKS = 60
+
+# Seconds one repeat of a case may take before larger sizes are skipped
+BUDGET = 30
+
+# Change in the best time per tick that counts when comparing to a
+# baseline. The best time is compared since it's the least noisy.
+THRESHOLD = 1.1
+
+# Ducks the plank levels are played with. Every duck that lands uses one
+# up, and running out would end the level in the middle of a case, so
+# there are more than the ducks any case lands.
+DUCKS = 100
+
+PLANK_WIDTH = 17
+PLANK_HEIGHT = 53
+TARGET_SIZE = 46
+
+def plank_level(count, seed=0):
+    """
+    Generates a level of breakable planks and targets in the format of the
+    level JSON files. The planks are stacked in columns across the play
+    area, every fourth one lying horizontally and belonging to a block with
+    its neighbours, and the targets are scattered under and between them.
+    About one entity in five is a target.
+
+    Parameters:
+        count (int): The number of entities, planks and targets together.
+        seed (int): Seed for the positions of the targets.
+
+    Returns:
+        dict: The level.
+    """
+    rng = random.Random(seed)
+    target_count = max(1, count // 5)
+    plank_count = max(1, count - target_count)
+    columns = list(range(340, WIN_WIDTH - PLANK_WIDTH, PLANK_WIDTH + 3))
+
+    planks = []
+    for i in range(plank_count):
+        layer, column = divmod(i, len(columns))
+        horizontal = layer % 4 == 3
+        planks.append({
+            "type": "horizontal" if horizontal else "vertical",
+            "block": "block{}_{}".format(column // 2, layer // 4),
+            "x": columns[column],
+            "y": GROUND_LEVEL + layer * PLANK_HEIGHT,
+            "w": PLANK_WIDTH,
+            "h": PLANK_HEIGHT,
+            "falling": False,
+            "vy": 0
+        })
+
+    targets = []
+    for _ in range(target_count):
+        targets.append({
+            "x": rng.randint(340, WIN_WIDTH - TARGET_SIZE),
+            "y": rng.randint(GROUND_LEVEL, WIN_HEIGHT - TARGET_SIZE),
+            "w": TARGET_SIZE,
+            "h": TARGET_SIZE,
+            "vy": 0
+        })
+
+    return {
+        "obstacle_type": "breakable",
+        "obstacles": planks,
+        "targets": targets,
+        "ducks": 3,
+        "next_level": None
+    }
+
+def write_level(directory, count):
+    """
+    Writes a generated level of planks into a level JSON file.
+
+    Parameters:
+        directory (str): The directory to write the file into.
+        count (int): The number of entities.
+
+    Returns:
+        str: Path of the level file.
+    """
+    path = os.path.join(directory, "planks{}.json".format(count))
+    if not os.path.exists(path):
+        with open(path, "w") as file:
+            json.dump(plank_level(count), file)
+    return path
+
+def load_planks(sim, path):
+    """
+    Loads a level of planks into a simulation and puts the duck in the sling.
+
+    Parameters:
+        sim (Simulation): The simulation.
+        path (str): Path of the level file.
+    """
+    sim.initial_state()
+    sim.load_level(path)
+    sim.game_state["level"] = path
+    sim.game_state["remaining_ducks"] = DUCKS
+
+def shoot(sim):
+    """
+    Pulls the sling back and releases the duck towards the planks.
+
+    Parameters:
+        sim (Simulation): The simulation.
+    """
+    sim.drag(-30, -15)
+    sim.release()
+
+#---------------------------------Cases------------------------------------------
+# Every case is a function that takes the simulation, the level file and the
+# number of entities, gets the simulation ready, and returns a function that
+# runs one tick.
+
+def update_case(sim, path, count):
+    """
+    Flies a duck into the planks through main.update().
+    """
+    load_planks(sim, path)
+    shoot(sim)
+    import main
+    return lambda: main.update(TICK)
+
+def drop_case(sim, path, count):
+    """
+    Drops the boxes of a random round of count boxes, starting from the
+    random positions create_items gives them.
+    """
+    sim.clear_entities()
+    sim.game_state["level"] = "random"
+    obstacles = count // 2
+    items = sim.create_items(obstacles, count - obstacles, GROUND_LEVEL, random.Random(0))
+    sim.game_state["boxes"] = items
+    sim.track_boxes(items)
+    sim.build_index()
+    return lambda: sim.drop(items)
+
+def breakable_collision_case(sim, path, count):
+    """
+    Moves the duck through the lowest layer of planks and checks it for
+    collisions, every tick.
+    """
+    load_planks(sim, path)
+    game = sim.game
+
+    def tick():
+        game["flight"] = True
+        sim.last_position = (300, GROUND_LEVEL + PLANK_HEIGHT / 2)
+        game["x"] = WIN_WIDTH
+        game["y"] = GROUND_LEVEL + PLANK_HEIGHT / 2
+        sim.check_breakable_collision()
+    return tick
+
+def falling_obstacle_case(sim, path, count):
+    """
+    Knocks every plank loose with a gap of one plank height opened above
+    each layer, so that the layers fall onto the targets and pile up on
+    each other.
+    """
+    load_planks(sim, path)
+    for plank in sim.game_state["breakable_obstacles"]:
+        plank["y"] += plank["y"] - GROUND_LEVEL
+        sim.break_plank(plank)
+    return sim.falling_obstacle
+
+def draw_first_case(sim, path, count):
+    """
+    Draws the first frame of a level, which builds its scene. The screens
+    of the game follow the simulation onto the level, since only the
+    screens of levels draw the scene.
+    """
+    import main
+    load_planks(sim, path)
+    main.machine.go(main.current_screen())
+    return main.draw
+
+def draw_case(sim, path, count):
+    """
+    Draws frames of a level while the duck flies, after the scene is built.
+    The tick of the simulation between frames is included.
+    """
+    import main
+    load_planks(sim, path)
+    main.machine.go(main.current_screen())
+    shoot(sim)
+    main.draw()
+
+    def tick():
+        sim.step()
+        main.machine.go(main.current_screen())
+        main.draw()
+    return tick
+
+# name: (case, whether it uses the game's own simulation in main.py,
+# whether it can be run with the NumPy entity stores, ticks per repeat)
+CASES = {
+    "update": (update_case, True, False, TICKS),
+    "drop": (drop_case, False, False, TICKS),
+    "check_breakable_collision": (breakable_collision_case, False, True, TICKS),
+    "falling_obstacle": (falling_obstacle_case, False, True, TICKS),
+    "draw_first": (draw_first_case, True, False, 1),
+    "draw": (draw_case, True, False, TICKS)
+}
+
+def game_simulation():
+    """
+    Imports main.py without a display and gives its simulation. The game
+    window is created the first time, for the draw benchmarks.
+
+    Returns:
+        Simulation: The simulation of main.py.
+    """
+    import pyglet
+    pyglet.options["headless"] = True
+    import main
+    import sweeperlib
+    if not sweeperlib.graphics["window"]:
+        main.create_game_window()
+    main.sim.verbose = False
+    return main.sim
+
+def run_case(name, count, path, use_numpy=False, repeats=REPEATS, budget=BUDGET):
+    """
+    Runs a benchmark case a number of times on a fresh level.
+
+    Parameters:
+        name (str): Name of the case, a key of CASES.
+        count (int): The number of entities.
+        path (str): Path of the generated level file with count entities.
+        use_numpy (bool): Whether the simulation uses the NumPy entity
+            stores.
+        repeats (int): How many times to run the case.
+        budget (float): Seconds one repeat may take. The repeats are stopped
+            when one goes over it.
+
+    Returns:
+        dict: The result: "case", "entities", "ticks", "repeats" and "best"
+              and "median" seconds per tick, and "over_budget" if a repeat
+              took too long.
+    """
+    setup, in_game, _, ticks = CASES[name]
+    clock = time.perf_counter
+    times = []
+    over_budget = False
+    for _ in range(repeats):
+        if in_game:
+            sim = game_simulation()
+        else:
+            sim = simulation.Simulation(verbose=False, use_numpy=use_numpy)
+        tick = setup(sim, path, count)
+        elapsed = 0
+        for _ in range(ticks):
+            started = clock()
+            tick()
+            elapsed += clock() - started
+            if elapsed > budget:
+                over_budget = True
+                break
+        if over_budget:
+            break
+        times.append(elapsed / ticks)
+
+    result = {
+        "case": name + ("[numpy]" if use_numpy else ""),
+        "entities": count,
+        "ticks": ticks,
+        "repeats": len(times),
+        "best": min(times) if times else None,
+        "median": statistics.median(times) if times else None
+    }
+    if over_budget:
+        result["over_budget"] = True
+    return result
+
+def run(sizes=SIZES, cases=None, repeats=REPEATS, budget=BUDGET, log=print):
+    """
+    Runs benchmark cases for every size.
+
+    Parameters:
+        sizes (list): The numbers of entities.
+        cases (list): Names of the cases to run, all of them by default.
+        repeats (int): How many times to run each case.
+        budget (float): Seconds one repeat may take before the case is
+            skipped for larger sizes.
+        log (function): Called with a line of text for every result, or
+            None.
+
+    Returns:
+        dict: Information about the run and "results", a list of results
+              as returned by run_case.
+    """
+    variants = []
+    for name in cases or CASES:
+        variants.append((name, False))
+        if numpy is not None and CASES[name][2]:
+            variants.append((name, True))
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        over = set()
+        for count in sorted(sizes):
+            path = write_level(directory, count)
+            for name, use_numpy in variants:
+                if (name, use_numpy) in over:
+                    continue
+                result = run_case(name, count, path, use_numpy, repeats, budget)
+                results.append(result)
+                if log:
+                    log(format_result(result))
+                if result.get("over_budget"):
+                    over.add((name, use_numpy))
+
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": numpy.__version__ if numpy is not None else None,
+        "platform": platform.platform(),
+        "results": results
+    }
+
+def format_result(result, baseline=None):
+    """
+    Formats a result as a line of text, with the change from the baseline
+    if there is one.
+
+    Parameters:
+        result (dict): The result, as returned by run_case.
+        baseline (dict): The same case in an earlier run, or None.
+
+    Returns:
+        str: The line.
+    """
+    line = "{:<32} {:>7} ".format(result["case"], result["entities"])
+    if result["median"] is None:
+        return line + "over budget"
+
+    line += "{:>12.1f} us/tick (median {:.1f})".format(result["best"] * 1e6, result["median"] * 1e6)
+    if baseline is not None and baseline.get("best"):
+        ratio = result["best"] / baseline["best"]
+        line += "  {:.2f}x baseline".format(ratio)
+        if ratio > THRESHOLD:
+            line += " SLOWER"
+        elif ratio < 1 / THRESHOLD:
+            line += " faster"
+    return line
+
+def compare(report, baseline):
+    """
+    Prints every result of a run next to the same case in a baseline.
+
+    Parameters:
+        report (dict): The new run, as returned by run.
+        baseline (dict): An earlier run, read from a baseline file.
+
+    Returns:
+        int: The number of cases that got slower by more than THRESHOLD.
+    """
+    earlier = {(result["case"], result["entities"]): result for result in baseline["results"]}
+    slower = 0
+    for result in report["results"]:
+        before = earlier.get((result["case"], result["entities"]))
+        print(format_result(result, before))
+        if before and before.get("best") and result["best"]:
+            slower += result["best"] / before["best"] > THRESHOLD
+    return slower
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Times the hot paths of the game.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="numbers of entities")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), help="cases to run")
+    parser.add_argument("--repeats", type=int, default=REPEATS, help="runs of each case")
+    parser.add_argument("--budget", type=float, default=BUDGET, help="seconds one run may take")
+    parser.add_argument("--output", help="write the results into this baseline file")
+    parser.add_argument("--compare", help="compare the results to this baseline file")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+    report = run(args.sizes, args.cases, args.repeats, args.budget, log=None if baseline else print)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=4)
+    if baseline:
+        sys.exit(1 if compare(report, baseline) else 0)
@@ -0,0 +1,244 @@
+"""
+Array-backed entity storage for A Wee Bit Miffed Ducks.
+
+The game state keeps targets, obstacles and planks as lists of dictionaries,
+which is what the level files contain. EntityStore keeps the same objects as
+NumPy arrays (one array per property) so that collision tests can be run
+for the whole level at once instead of one dictionary at a time. The
+dictionaries stay the "view" of the objects: whatever moves an object
+changes its dictionary and copies it into the store (see update), so the
+rest of the game and the level files keep working with them as before.
+
+Only the collision tests are vectorized. Falling planks and the boxes of
+random rounds are moved by stacking.StackSolver, which needs the contacts
+between them, so the store doesn't keep velocities or integrate gravity; it
+is told the new positions through update like every other move.
+
+NumPy is optional. If it isn't installed, AVAILABLE is False and the game
+uses the plain Python code paths in simulation.py.
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+AVAILABLE = numpy is not None
+
+class EntityStore:
+    """
+    Keeps the positions and sizes of a list of objects in float arrays, and
+    their state in boolean masks.
+
+    Attributes:
+        entities (list): The dictionaries the rows belong to, in row order.
+        rows (dict): Row numbers keyed by the id of each dictionary.
+        x, y, w, h (numpy.ndarray): Float arrays of the properties.
+        alive (numpy.ndarray): False for rows whose object was destroyed.
+        falling (numpy.ndarray): True for rows whose object is falling.
+    """
+
+    def __init__(self, entities):
+        if numpy is None:
+            raise ImportError("EntityStore needs NumPy")
+
+        self.entities = list(entities)
+        self.rows = {id(entity): row for row, entity in enumerate(self.entities)}
+        self.x = numpy.array([entity["x"] for entity in self.entities], dtype=float)
+        self.y = numpy.array([entity["y"] for entity in self.entities], dtype=float)
+        self.w = numpy.array([entity["w"] for entity in self.entities], dtype=float)
+        self.h = numpy.array([entity["h"] for entity in self.entities], dtype=float)
+        self.alive = numpy.ones(len(self.entities), dtype=bool)
+        self.falling = numpy.array(
+            [entity.get("falling", False) for entity in self.entities], dtype=bool
+        )
+
+    def __len__(self):
+        """
+        Returns the number of rows, including destroyed objects.
+        """
+        return len(self.entities)
+
+    def to_dicts(self):
+        """
+        Returns the objects that are still alive as new dictionaries, in the
+        same format as the level files use.
+
+        Returns:
+            list: The objects as dictionaries.
+        """
+        dicts = []
+        for row in numpy.flatnonzero(self.alive):
+            entity = dict(self.entities[row])
+            entity["x"] = float(self.x[row])
+            entity["y"] = float(self.y[row])
+            if "falling" in entity:
+                entity["falling"] = bool(self.falling[row])
+            dicts.append(entity)
+        return dicts
+
+    def update(self, entity):
+        """
+        Copies an object's position and falling state from its
+        dictionary into the arrays, after something other than the store has
+        changed it.
+
+        Parameters:
+            entity (dict): The object that changed.
+        """
+        row = self.rows.get(id(entity))
+        if row is not None:
+            self.x[row] = entity["x"]
+            self.y[row] = entity["y"]
+            self.falling[row] = entity.get("falling", False)
+
+    def kill(self, entity):
+        """
+        Marks an object as destroyed, so that it's left out of every test.
+
+        Parameters:
+            entity (dict): The destroyed object.
+        """
+        row = self.rows.get(id(entity))
+        if row is not None:
+            self.alive[row] = False
+
+    def first_box_hit(self, x0, y0, x1, y1):
+        """
+        Finds the first box (by time of impact, then by row) that a point
+        moving from (x0, y0) to (x1, y1) hits, testing all boxes at once with
+        the slab method. Follows simulation.swept_box_hit: a move that starts
+        inside a box only hits it if it also ends inside it.
+
+        Parameters:
+            x0 (float): x-coordinate where the move started.
+            y0 (float): y-coordinate where the move started.
+            x1 (float): x-coordinate where the move ended.
+            y1 (float): y-coordinate where the move ended.
+
+        Returns:
+            tuple: The object hit and the time of impact, or (None, None).
+        """
+        if not len(self.entities):
+            return None, None
+
+        left = self.x
+        bottom = self.y
+        right = self.x + self.w
+        top = self.y + self.h
+        start_in = (left <= x0) & (x0 <= right) & (bottom <= y0) & (y0 <= top)
+        end_in = (left <= x1) & (x1 <= right) & (bottom <= y1) & (y1 <= top)
+
+        t_enter = numpy.zeros(len(self.entities))
+        t_exit = numpy.ones(len(self.entities))
+        inside = numpy.ones(len(self.entities), dtype=bool)
+        for start, delta, low, high in ((x0, x1 - x0, left, right), (y0, y1 - y0, bottom, top)):
+            if delta == 0:
+                inside &= (low <= start) & (start <= high)
+            else:
+                t_low = (low - start) / delta
+                t_high = (high - start) / delta
+                t_enter = numpy.maximum(t_enter, numpy.minimum(t_low, t_high))
+                t_exit = numpy.minimum(t_exit, numpy.maximum(t_low, t_high))
+
+        times = numpy.where(
+            start_in,
+            numpy.where(end_in, 1.0, numpy.inf),
+            numpy.where(inside & (t_enter <= t_exit), t_enter, numpy.inf)
+        )
+        return self.first(times)
+
+    def first_circle_hit(self, x0, y0, x1, y1):
+        """
+        Finds the first target (by time of impact, then by row) that a point
+        moving from (x0, y0) to (x1, y1) hits, testing all targets at once.
+        Targets are circles with a radius of half their width around their
+        position. Follows simulation.swept_circle_hit: a move that starts
+        inside a circle only hits it if it also ends inside it.
+
+        Parameters:
+            x0 (float): x-coordinate where the move started.
+            y0 (float): y-coordinate where the move started.
+            x1 (float): x-coordinate where the move ended.
+            y1 (float): y-coordinate where the move ended.
+
+        Returns:
+            tuple: The object hit and the time of impact, or (None, None).
+        """
+        if not len(self.entities):
+            return None, None
+
+        radius = self.w / 2
+        fx = x0 - self.x
+        fy = y0 - self.y
+        c = fx * fx + fy * fy - radius * radius
+        start_in = numpy.sqrt(fx * fx + fy * fy) <= radius
+        end_in = numpy.hypot(x1 - self.x, y1 - self.y) <= radius
+
+        dx = x1 - x0
+        dy = y1 - y0
+        a = dx * dx + dy * dy
+        times = numpy.full(len(self.entities), numpy.inf)
+        if a > 0:
+            b = 2 * (fx * dx + fy * dy)
+            discriminant = b * b - 4 * a * c
+            root = numpy.sqrt(numpy.maximum(discriminant, 0))
+            t = (-b - root) / (2 * a)
+            times = numpy.where((discriminant >= 0) & (0 <= t) & (t <= 1), t, numpy.inf)
+        times = numpy.where(start_in, numpy.where(end_in, 1.0, numpy.inf), times)
+        return self.first(times)
+
+    def vertical_circle_hits(self, x, y0, y1):
+        """
+        Finds the targets hit by points moving straight down or up, e.g. the
+        left edges of falling planks at their x-coordinate, testing every
+        point against every target at once. Follows simulation.swept_circle_hit.
+
+        Parameters:
+            x (sequence): x-coordinates of the points.
+            y0 (sequence): y-coordinates where the moves started.
+            y1 (sequence): y-coordinates where the moves ended.
+
+        Returns:
+            list: The targets hit, in row order.
+        """
+        if not len(self.entities) or not len(x):
+            return []
+
+        x = numpy.asarray(x, dtype=float)
+        y0 = numpy.asarray(y0, dtype=float)
+        y1 = numpy.asarray(y1, dtype=float)
+
+        radius = self.w[None, :] / 2
+        dx = numpy.abs(x[:, None] - self.x[None, :])
+        start_in = numpy.hypot(dx, y0[:, None] - self.y[None, :]) <= radius
+        end_in = numpy.hypot(dx, y1[:, None] - self.y[None, :]) <= radius
+
+        # A vertical move crosses the circle where |dy| <= sqrt(r^2 - dx^2)
+        half_chord = numpy.sqrt(numpy.maximum(radius * radius - dx * dx, 0))
+        low = numpy.minimum(y0, y1)[:, None]
+        high = numpy.maximum(y0, y1)[:, None]
+        crosses = (
+            (dx <= radius)
+            & (low <= self.y[None, :] + half_chord)
+            & (self.y[None, :] - half_chord <= high)
+        )
+        hits = numpy.where(start_in, end_in, crosses).any(axis=0) & self.alive
+        return [self.entities[row] for row in numpy.flatnonzero(hits)]
+
+    def first(self, times):
+        """
+        Picks the living row with the smallest time of impact.
+
+        Parameters:
+            times (numpy.ndarray): Time of impact for every row, infinite for
+                rows that weren't hit.
+
+        Returns:
+            tuple: The object hit and the time of impact, or (None, None).
+        """
+        times = numpy.where(self.alive, times, numpy.inf)
+        row = int(numpy.argmin(times))
+        if not numpy.isfinite(times[row]):
+            return None, None
+        return self.entities[row], float(times[row])
@@ -0,0 +1,129 @@
+"""
+Settled layouts for the random rounds of A Wee Bit Miffed Ducks.
+
+Simulation.create_items places every obstacle and target at an independent
+random position, so items can overlap and start in the air, and drop() then
+has to sort them out over the first ticks of the round. The functions here
+build a layout that is valid from the start instead: the play area is split
+into columns (a jittered grid), every item is put into a random column and
+stacked on top of whatever is already there. No two items overlap, and every
+item lies on the ground or on the item under it, so the first drop() puts
+the whole layout to sleep.
+
+Stacks only grow up to the top of the window, which limits how many items
+a layout can have. A column that is full moves the next items to the other
+columns, so an area holds about (top - ground) / 26 obstacles or
+(top - ground) / 46 targets per column. With the defaults (6 columns
+between x = 340 and 626, and 291 pixels from the ground at y = 85 to the
+top at y = 376) that is at most 66 obstacles or 36 targets, or a mix of
+the two. Asking for more items than fit raises ValueError instead of
+stacking them out of sight. The same seed always gives the same layout.
+"""
+
+import math
+import random
+
+OBSTACLE_SIZE = (25, 26)
+TARGET_SIZE = (46, 46)
+
+def column_lefts(rng, left, right, cell, density):
+    """
+    Splits an area into columns of equal width and picks where each column
+    starts. With a density below 1 the columns are spaced further apart and
+    each column is shifted by a random amount inside its own slot, so the
+    columns never overlap.
+
+    Parameters:
+        rng (random.Random): The random number generator to use.
+        left (int): x-coordinate of the area's left edge.
+        right (int): x-coordinate of the area's right edge.
+        cell (int): Width of one column.
+        density (float): How much of the area's width is taken up by
+            columns, between 0 (exclusive) and 1.
+
+    Returns:
+        list: The x-coordinates of the columns' left edges.
+    """
+    if not 0 < density <= 1:
+        raise ValueError("density must be between 0 and 1")
+
+    slot = cell / density
+    count = max(1, math.floor((right - left) / slot))
+    return [left + round(i * slot + rng.uniform(0, slot - cell)) for i in range(count)]
+
+def settled_items(seed, obs_num, tar_num, density=1.0, left=340, right=626, ground=85,
+                  top=376):
+    """
+    Generates obstacles and targets stacked in columns so that none of them
+    overlap and all of them are already resting.
+
+    The columns are as wide as the widest item, and items are placed at a
+    random x-coordinate inside their column. Any two items in the same column
+    then overlap horizontally, so an item always lies on the one under it and
+    drop() agrees with the layout. No stack reaches above `top`: an item
+    that doesn't fit in its column goes into another column that still has
+    room for it.
+
+    Parameters:
+        seed (int): Seed for the random number generator.
+        obs_num (int): The number of obstacles to generate.
+        tar_num (int): The number of targets to generate.
+        density (float): How much of the area's width is taken up by
+            columns, between 0 (exclusive) and 1. Lower densities give fewer
+            but taller stacks.
+        left (int): x-coordinate of the area's left edge.
+        right (int): x-coordinate of the area's right edge.
+        ground (int): y-coordinate the lowest items rest on.
+        top (int): y-coordinate no item may reach above, e.g. the top of
+            the window.
+
+    Returns:
+        tuple: The obstacles and the targets, as two lists of dictionaries
+               in the same format create_items uses.
+
+    Raises:
+        ValueError: If the items don't fit under `top` at the given density.
+    """
+    rng = random.Random(seed)
+    cell = max(OBSTACLE_SIZE[0], TARGET_SIZE[0])
+    lefts = column_lefts(rng, left, right, cell, density)
+    heights = [ground] * len(lefts)
+    # Columns that still have room for a target and for an obstacle. A
+    # column that is too full for an item of a kind is dropped for good,
+    # since stacks only grow.
+    open_columns = {True: list(range(len(lefts))), False: list(range(len(lefts)))}
+
+    kinds = [True] * tar_num + [False] * obs_num
+    rng.shuffle(kinds)
+
+    obstacles = []
+    targets = []
+    for is_target in kinds:
+        width, height = TARGET_SIZE if is_target else OBSTACLE_SIZE
+        columns = open_columns[is_target]
+        while True:
+            if not columns:
+                raise ValueError(
+                    "{} obstacles and {} targets don't fit under y = {} at density {}".format(
+                        obs_num, tar_num, top, density
+                    )
+                )
+            index = rng.randrange(len(columns))
+            column = columns[index]
+            if heights[column] + height <= top:
+                break
+            columns[index] = columns[-1]
+            columns.pop()
+        item = {
+            "x": lefts[column] + rng.randint(0, cell - width),
+            "y": heights[column],
+            "w": width,
+            "h": height,
+            "vy": 0
+        }
+        heights[column] += height
+        if is_target:
+            targets.append(item)
+        else:
+            obstacles.append(item)
+    return obstacles, targets
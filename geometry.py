@@ -0,0 +1,109 @@
+"""
+Swept collision tests for A Wee Bit Miffed Ducks.
+
+Instead of only checking where an object is after a step, these functions
+check the whole line segment it moved along during the step and return the
+earliest time of impact as a fraction of the step (0 is the start of the
+segment, 1 the end). That way a fast duck can't pass through a thin
+obstacle between two ticks.
+"""
+
+import math
+
+def point_in_box(x, y, left, bottom, width, height):
+    """
+    Checks if a point is inside an axis-aligned box. Points on the edges
+    count as inside.
+
+    Parameters:
+        x (float): x-coordinate of the point.
+        y (float): y-coordinate of the point.
+        left (float): x-coordinate of the box's left edge.
+        bottom (float): y-coordinate of the box's bottom edge.
+        width (float): Width of the box.
+        height (float): Height of the box.
+
+    Returns:
+        bool: True if the point is inside the box.
+    """
+    return left <= x <= left + width and bottom <= y <= bottom + height
+
+def segment_box_toi(x0, y0, x1, y1, left, bottom, width, height):
+    """
+    Calculates when a point moving along a line segment first touches an
+    axis-aligned box, using the slab method. Points on the edges count as
+    inside, like in point_in_box.
+
+    Parameters:
+        x0 (float): x-coordinate of the segment's start.
+        y0 (float): y-coordinate of the segment's start.
+        x1 (float): x-coordinate of the segment's end.
+        y1 (float): y-coordinate of the segment's end.
+        left (float): x-coordinate of the box's left edge.
+        bottom (float): y-coordinate of the box's bottom edge.
+        width (float): Width of the box.
+        height (float): Height of the box.
+
+    Returns:
+        float: Time of impact between 0 and 1, or None if the segment misses
+               the box. 0 if the segment starts inside the box.
+    """
+    t_enter = 0.0
+    t_exit = 1.0
+    for start, delta, low, high in (
+        (x0, x1 - x0, left, left + width),
+        (y0, y1 - y0, bottom, bottom + height)
+    ):
+        if delta == 0:
+            if start < low or start > high:
+                return None
+        else:
+            t_low = (low - start) / delta
+            t_high = (high - start) / delta
+            if t_low > t_high:
+                t_low, t_high = t_high, t_low
+            t_enter = max(t_enter, t_low)
+            t_exit = min(t_exit, t_high)
+            if t_enter > t_exit:
+                return None
+    return t_enter
+
+def segment_circle_toi(x0, y0, x1, y1, x_center, y_center, radius):
+    """
+    Calculates when a point moving along a line segment first touches a
+    circle. Points on the circle count as inside.
+
+    Parameters:
+        x0 (float): x-coordinate of the segment's start.
+        y0 (float): y-coordinate of the segment's start.
+        x1 (float): x-coordinate of the segment's end.
+        y1 (float): y-coordinate of the segment's end.
+        x_center (float): x-coordinate of the circle's center.
+        y_center (float): y-coordinate of the circle's center.
+        radius (float): Radius of the circle.
+
+    Returns:
+        float: Time of impact between 0 and 1, or None if the segment misses
+               the circle. 0 if the segment starts inside the circle.
+    """
+    fx = x0 - x_center
+    fy = y0 - y_center
+    c = fx * fx + fy * fy - radius * radius
+    if c <= 0:
+        return 0.0
+
+    dx = x1 - x0
+    dy = y1 - y0
+    a = dx * dx + dy * dy
+    if a == 0:
+        return None
+
+    b = 2 * (fx * dx + fy * dy)
+    discriminant = b * b - 4 * a * c
+    if discriminant < 0:
+        return None
+
+    t = (-b - math.sqrt(discriminant)) / (2 * a)
+    if 0 <= t <= 1:
+        return t
+    return None
@@ -0,0 +1,271 @@
+"""
+Binary level files for A Wee Bit Miffed Ducks.
+
+The levels that come with the game are JSON files with a dictionary for
+every object, which is easy to edit but slow to read for big generated
+levels. This module stores the same data in a compact binary form:
+
+    header    magic, version, number of ducks, next level, obstacle type
+              and the number of strings, obstacles and targets (HEADER)
+    strings   the strings the level uses (level names, the obstacle type,
+              plank types and blocks), each as a length byte and UTF-8 bytes
+    records   one fixed-width record per obstacle and then per target
+              (RECORD): x, y, w, h and vy as 64-bit floats, the plank type and
+              block as indices into the strings (0 if the object doesn't
+              have one) and flag bits for `falling`
+
+Records are read straight from the file with struct.iter_unpack, and big
+files are memory-mapped instead of read into memory first. The numbers are
+stored as 64-bit floats like JSON numbers, so every coordinate is read back
+exactly as it was written.
+
+The converter can be run from the command line:
+
+    python levelfile.py level1.json level2.json
+"""
+
+import os
+import sys
+import json
+import mmap
+import struct
+
+EXTENSION = ".lvl"
+MAGIC = b"DUCKLVL\0"
+VERSION = 3
+
+# magic, version, ducks, next level (string index), obstacle type (string
+# index), strings, obstacles, targets
+HEADER = struct.Struct("<8sHHHHHII")
+# x, y, w, h, vy, type (string index), block (string index), flags
+RECORD = struct.Struct("<5dHHB")
+
+HAS_FALLING = 1
+FALLING = 2
+
+# Files larger than this are memory-mapped instead of read
+MMAP_THRESHOLD = 1 << 16
+
+def binary_path(path):
+    """
+    Gives the name of the binary file for a JSON level file.
+
+    Parameters:
+        path (str): Path of the JSON file, e.g. "level1.json".
+
+    Returns:
+        str: The same path with EXTENSION instead, e.g. "level1.lvl".
+    """
+    return os.path.splitext(path)[0] + EXTENSION
+
+def pack_level(data):
+    """
+    Packs a level into the binary format.
+
+    Parameters:
+        data (dict): The level, in the same format as the JSON files
+            ("obstacles", "targets", "ducks", "next_level" and optionally
+            "obstacle_type").
+
+    Returns:
+        bytes: The packed level.
+    """
+    strings = [""]
+    string_index = {"": 0}
+
+    def index(value):
+        if value is None:
+            return 0
+        if value not in string_index:
+            string_index[value] = len(strings)
+            strings.append(value)
+        return string_index[value]
+
+    records = []
+    for kind in ("obstacles", "targets"):
+        for entity in data[kind]:
+            flags = 0
+            if "falling" in entity:
+                flags |= HAS_FALLING
+                if entity["falling"]:
+                    flags |= FALLING
+            records.append(RECORD.pack(
+                entity["x"], entity["y"], entity["w"], entity["h"], entity.get("vy", 0),
+                index(entity.get("type")), index(entity.get("block")), flags
+            ))
+
+    next_level = index(data.get("next_level"))
+    obstacle_type = index(data.get("obstacle_type"))
+    encoded = [string.encode("utf-8") for string in strings[1:]]
+    if any(len(string) > 255 for string in encoded):
+        raise ValueError("Strings in level files can be at most 255 bytes long")
+    header = HEADER.pack(
+        MAGIC, VERSION, data["ducks"], next_level, obstacle_type, len(encoded),
+        len(data["obstacles"]), len(data["targets"])
+    )
+    parts = [header]
+    for string in encoded:
+        parts.append(bytes([len(string)]) + string)
+    parts.extend(records)
+    return b"".join(parts)
+
+def read_header(view):
+    """
+    Reads and checks the header of a packed level.
+
+    Parameters:
+        view (memoryview): The packed level.
+
+    Returns:
+        tuple: The number of ducks, the string indices of the next level
+               and the obstacle type and the number of strings, obstacles
+               and targets.
+
+    Raises:
+        ValueError: If the buffer isn't a level file of a known version.
+    """
+    if len(view) < HEADER.size:
+        raise ValueError("Not a level file")
+
+    magic, version, *counts = HEADER.unpack_from(view)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a level file of version {}".format(VERSION))
+    return tuple(counts)
+
+def read_strings(view, count):
+    """
+    Reads the strings that follow the header of a packed level.
+
+    Parameters:
+        view (memoryview): The packed level.
+        count (int): The number of strings.
+
+    Returns:
+        tuple: The strings, with None as index 0, and the offset of the
+               first record.
+
+    Raises:
+        ValueError: If the strings are cut short or aren't UTF-8.
+    """
+    strings = [None]
+    offset = HEADER.size
+    for _ in range(count):
+        if offset >= len(view) or offset + 1 + view[offset] > len(view):
+            raise ValueError("Level file is truncated")
+        length = view[offset]
+        strings.append(str(view[offset + 1:offset + 1 + length], "utf-8"))
+        offset += 1 + length
+    return strings, offset
+
+def unpack_level(buffer):
+    """
+    Unpacks a level from the binary format. Numbers are read back as floats
+    if they have a fraction and as integers otherwise, like in JSON files.
+
+    Parameters:
+        buffer (bytes-like): The packed level, e.g. bytes or an mmap.
+
+    Returns:
+        dict: The level, in the same format as the JSON files.
+
+    Raises:
+        ValueError: If the buffer isn't a level file of a known version.
+    """
+    # The views are released even if the file is broken, since an mmap
+    # can't be closed while they still point into it
+    view = memoryview(buffer)
+    try:
+        ducks, next_level, obstacle_type, string_count, obstacle_count, target_count = (
+            read_header(view)
+        )
+        strings, offset = read_strings(view, string_count)
+        end = offset + RECORD.size * (obstacle_count + target_count)
+        if len(view) < end:
+            raise ValueError("Level file is truncated")
+
+        entities = []
+        records = view[offset:end]
+        try:
+            for x, y, w, h, vy, kind, block, flags in RECORD.iter_unpack(records):
+                entity = {}
+                if kind:
+                    entity["type"] = strings[kind]
+                if block:
+                    entity["block"] = strings[block]
+                entity["x"] = int(x) if x.is_integer() else x
+                entity["y"] = int(y) if y.is_integer() else y
+                entity["w"] = int(w) if w.is_integer() else w
+                entity["h"] = int(h) if h.is_integer() else h
+                if flags & HAS_FALLING:
+                    entity["falling"] = bool(flags & FALLING)
+                entity["vy"] = int(vy) if vy.is_integer() else vy
+                entities.append(entity)
+        finally:
+            records.release()
+    finally:
+        view.release()
+
+    data = {
+        "obstacles": entities[:obstacle_count],
+        "targets": entities[obstacle_count:],
+        "ducks": ducks,
+        "next_level": strings[next_level]
+    }
+    if obstacle_type:
+        data["obstacle_type"] = strings[obstacle_type]
+    return data
+
+def load(path):
+    """
+    Reads a binary level file. Files bigger than MMAP_THRESHOLD are
+    memory-mapped, so the records are read from the file without copying
+    it into memory first.
+
+    Parameters:
+        path (str): Path of the level file.
+
+    Returns:
+        dict: The level, in the same format as the JSON files.
+
+    Raises:
+        IOError: If the file can't be read.
+        ValueError: If the file isn't a level file of a known version.
+    """
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size <= MMAP_THRESHOLD:
+            return unpack_level(file.read())
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return unpack_level(mapped)
+
+def save(path, data):
+    """
+    Writes a level to a binary level file.
+
+    Parameters:
+        path (str): Path of the level file.
+        data (dict): The level, in the same format as the JSON files.
+    """
+    with open(path, "wb") as file:
+        file.write(pack_level(data))
+
+def convert(json_path, path=None):
+    """
+    Converts a JSON level file into a binary one.
+
+    Parameters:
+        json_path (str): Path of the JSON file.
+        path (str): Path of the binary file. The default is the JSON file's
+            path with EXTENSION.
+
+    Returns:
+        str: Path of the binary file.
+    """
+    if path is None:
+        path = binary_path(json_path)
+    with open(json_path) as file:
+        save(path, json.load(file))
+    return path
+
+if __name__ == "__main__":
+    for name in sys.argv[1:]:
+        print("{} -> {}".format(name, convert(name)))
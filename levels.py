@@ -0,0 +1,324 @@
+"""
+Level loading for A Wee Bit Miffed Ducks.
+
+Levels are read from JSON files or binary level files (see levelfile) only
+once. LevelCache keeps a frozen copy of every level it has read, made of
+tuples so that nothing played in the game can change it, and gives out new
+dictionaries for every attempt. Restarting a level then needs no disk access,
+and changes made while playing (falling planks, their velocities, etc.)
+can't carry over to the next attempt.
+
+LevelRegistry indexes the level files in a directory by name and follows
+the `next_level` field of each level, so a campaign is just a chain of level
+files and new levels can be added without changing any code. Only files
+named like levels (level1.json, level2.lvl, etc.) are indexed, so other
+JSON files in the same directory, e.g. profiles and benchmark results,
+are left alone.
+"""
+
+import os
+import re
+import json
+import levelfile
+
+# Extensions of level files, in order of preference if a level has both
+LEVEL_EXTENSIONS = (levelfile.EXTENSION, ".json")
+
+# Start of the names of level files
+LEVEL_PREFIX = "level"
+
+def read_level(path):
+    """
+    Reads a level file, either JSON or binary depending on its extension.
+
+    Parameters:
+        path (str): Path of the level file.
+
+    Returns:
+        dict: The level ("obstacles", "targets", "ducks" and "next_level").
+
+    Raises:
+        IOError: If the file can't be read.
+        ValueError: If the file isn't a valid level file.
+    """
+    if path.endswith(levelfile.EXTENSION):
+        data = levelfile.load(path)
+    else:
+        with open(path) as file:
+            data = json.load(file)
+    check_level(data)
+    return data
+
+def check_level(data):
+    """
+    Checks that data read from a level file has the fields of a level, so
+    that a JSON file that isn't a level fails when it's read instead of when
+    it's played.
+
+    Parameters:
+        data: The data read from the file.
+
+    Raises:
+        ValueError: If the data isn't a level.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("A level must be a JSON object")
+    for kind in ("obstacles", "targets"):
+        if not isinstance(data.get(kind), list):
+            raise ValueError(f"A level must have a list of {kind}")
+    if not isinstance(data.get("ducks"), int):
+        raise ValueError("A level must have a number of ducks")
+
+def freeze(data):
+    """
+    Makes an unchangeable copy of a level, with every object as a tuple of
+    (key, value) pairs.
+
+    Parameters:
+        data (dict): The level, as read by read_level.
+
+    Returns:
+        dict: The frozen level.
+    """
+    frozen = dict(data)
+    for kind in ("obstacles", "targets"):
+        frozen[kind] = tuple(tuple(entity.items()) for entity in data[kind])
+    return frozen
+
+def thaw(frozen):
+    """
+    Makes a new, changeable level from a frozen one. Every object gets a
+    dictionary of its own.
+
+    Parameters:
+        frozen (dict): The level, as made by freeze.
+
+    Returns:
+        dict: The level, in the same format read_level gives.
+    """
+    data = dict(frozen)
+    for kind in ("obstacles", "targets"):
+        data[kind] = [dict(entity) for entity in frozen[kind]]
+    return data
+
+class LevelCache:
+    """
+    Keeps the levels that have been loaded, so each file is only read once.
+
+    Attributes:
+        snapshots (dict): Frozen levels (see freeze), keyed by path.
+    """
+
+    def __init__(self):
+        self.snapshots = {}
+
+    def snapshot(self, path):
+        """
+        Gives the frozen form of a level, reading the file the first time.
+
+        Parameters:
+            path (str): Path of the level file.
+
+        Returns:
+            dict: The frozen level.
+        """
+        frozen = self.snapshots.get(path)
+        if frozen is None:
+            frozen = self.snapshots[path] = freeze(read_level(path))
+        return frozen
+
+    def load(self, path):
+        """
+        Gives a fresh copy of a level that can be played and changed freely.
+
+        Parameters:
+            path (str): Path of the level file.
+
+        Returns:
+            dict: The level, in the same format read_level gives.
+        """
+        return thaw(self.snapshot(path))
+
+    def forget(self, path=None):
+        """
+        Drops a level from the cache, e.g. after its file has been edited,
+        so it's read again the next time. Without a path, every level is
+        dropped.
+
+        Parameters:
+            path (str): Path of the level file, or None.
+        """
+        if path is None:
+            self.snapshots.clear()
+        else:
+            self.snapshots.pop(path, None)
+
+def level_name(path):
+    """
+    Gives the name of a level: its file name without the directory and
+    extension, e.g. "level2" for "levels/level2.json".
+
+    Parameters:
+        path (str): Path or file name of the level.
+
+    Returns:
+        str: The name of the level.
+    """
+    return os.path.splitext(os.path.basename(path))[0]
+
+def natural_key(name):
+    """
+    Sorting key that puts numbers in names in numeric order, so that
+    "level2" comes before "level10".
+
+    Parameters:
+        name (str): A level name.
+
+    Returns:
+        list: The key.
+    """
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name)]
+
+class LevelRegistry:
+    """
+    Knows the level files in a directory by their names. Only the directory
+    listing is read when the registry is made; the levels themselves are
+    read through the cache when they are first needed, e.g. to find out
+    which level comes next. A file that turns out not to be a valid level
+    is dropped from the registry when it's read, so the campaign goes on
+    as if it weren't there.
+
+    Attributes:
+        directory (str): The directory the levels are in.
+        cache (LevelCache): The cache levels are read through.
+        paths (dict): Paths of the level files, keyed by level name.
+    """
+
+    def __init__(self, directory=".", cache=None):
+        self.directory = directory
+        self.cache = cache if cache is not None else LevelCache()
+        self.paths = {}
+        self.scan()
+
+    def scan(self):
+        """
+        Indexes the level files in the directory again, e.g. after new levels
+        have been added. Only files whose names start with LEVEL_PREFIX are
+        levels. If a level has both a binary and a JSON file, the binary one
+        is used.
+        """
+        self.paths.clear()
+        for extension in reversed(LEVEL_EXTENSIONS):
+            for file_name in os.listdir(self.directory):
+                if file_name.startswith(LEVEL_PREFIX) and file_name.endswith(extension):
+                    path = os.path.normpath(os.path.join(self.directory, file_name))
+                    self.paths[level_name(file_name)] = path
+
+    def read(self, name):
+        """
+        Reads a level through the cache. If the file can't be read or isn't a
+        valid level, the level is dropped from the registry.
+
+        Parameters:
+            name (str): The level name.
+
+        Returns:
+            dict: The frozen level (see freeze), or None if there is no such
+                  level or it couldn't be read.
+        """
+        path = self.paths.get(level_name(name))
+        if path is None:
+            return None
+        try:
+            return self.cache.snapshot(path)
+        except (IOError, ValueError):
+            del self.paths[level_name(name)]
+            return None
+
+    def names(self):
+        """
+        Gives the names of all levels in natural order (see natural_key).
+
+        Returns:
+            list: The level names.
+        """
+        return sorted(self.paths, key=natural_key)
+
+    def first(self):
+        """
+        Gives the level a campaign starts from: the first valid one in
+        natural order, e.g. "level1".
+
+        Returns:
+            str: The level name, or None if there are no levels.
+        """
+        for name in self.names():
+            if self.read(name) is not None:
+                return name
+        return None
+
+    def path(self, name):
+        """
+        Finds the file of a level. The name can also be a file name like the
+        ones in `next_level` fields, e.g. "level2.json".
+
+        Parameters:
+            name (str): The level name.
+
+        Returns:
+            str: Path of the level file.
+
+        Raises:
+            KeyError: If there is no such level.
+        """
+        return self.paths[level_name(name)]
+
+    def next(self, name):
+        """
+        Gives the level that follows a level, according to its `next_level`
+        field.
+
+        Parameters:
+            name (str): The level name.
+
+        Returns:
+            str: The name of the next level, or None if it's the last one,
+                 the level can't be read or the next one isn't in the
+                 registry.
+        """
+        frozen = self.read(name)
+        next_level = frozen.get("next_level") if frozen is not None else None
+        if not next_level or level_name(next_level) not in self.paths:
+            return None
+        return level_name(next_level)
+
+    def chain(self, name):
+        """
+        Goes through a campaign from a level to its last level, following the
+        `next_level` fields. Stops if a level refers back to an earlier one.
+
+        Parameters:
+            name (str): The level to start from.
+
+        Yields:
+            str: The level names, starting with the given one.
+        """
+        seen = set()
+        while name is not None and name not in seen:
+            seen.add(name)
+            yield name
+            name = self.next(name)
+
+    def prefetch(self, name, count=1):
+        """
+        Reads the levels after a level into the cache ahead of time, so that
+        continuing to them doesn't need any disk access.
+
+        Parameters:
+            name (str): The level being played.
+            count (int): How many of the following levels to read.
+        """
+        for i, following in enumerate(self.chain(name)):
+            if i > count:
+                break
+            self.read(following)
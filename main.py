@@ -42,74 +42,105 @@ Controls:
 
     In Game:
         R: Restart current level (only available in normal levels and first random level)
-        C: Continue to next level (only works for level 1 of normal stage)
+        C: Continue to next level (only works if the level has a next_level)
 
 By following the gameplay rules and overcoming obstacles, players will advance through 
 levels and ultimately win or lose the game.
 """
 
+import sys
+import time
+import random
+import argparse
 import sweeperlib
-import pyglet
-import math
-import json
-import random 
+import simulation
+import levels
+import replay
+import profiler
+import screens
 from sweeperlib import KEYS
+from simulation import WIN_WIDTH, WIN_HEIGHT, GROUND_LEVEL
 
-WIN_WIDTH = 626
-WIN_HEIGHT = 376
-START_X = 50
-START_Y = 110
-GROUND_LEVEL = 85
-FORCE_FACTOR = 0.6
-GRAVITATIONAL_ACC = 1.5
-MAX_DUCKS = 10
-TOTAL_ROUNDS = 3
-CURRENT_ROUND = 1
-
-game = {
-    "x": START_X,
-    "y": START_Y,
-    "w": 0,
-    "h": 0,
-    "angle": 0,
-    "force": 0,
-    "x_velocity": 0,
-    "y_velocity": 0,
-    "flight": False,
-    "dragging": False
+sim = simulation.Simulation(background=True)
+game = sim.game
+game_state = sim.game_state
+registry = levels.LevelRegistry(".", sim.levels)
+
+#The campaign level being played, for restarting it
+campaign = {
+    "level": None
 }
 
-game_state = {
-    "targets": [],
-    "obstacles": [],
-    "breakable_obstacles": [],
-    "boxes": [],
-    "used_ducks": [],
-    "remaining_ducks": MAX_DUCKS,
-    "level": "menu",
-    "next_level": None,
-    "is_random": False
+#Screens the game can be on. Every level of the campaign is played on the 
+#"level" screen, the others are named after game_state["level"].
+SCREENS = ("menu", "level", "random", "win", "lose")
+PLAY_SCREENS = ("level", "random")
+
+#Writes the input into a replay file if the game was started with --record
+recorder = None
+
+#Times the game loop while enabled (F3), see profiler.Profiler
+timings = profiler.Profiler()
+timings.add_section(sim, "advance", "update")
+for section in (
+    "step", "drop", "obstacle_collision", "target_collision",
+    "check_breakable_collision", "falling_obstacle", "predict_path"
+):
+    timings.add_section(sim, section)
+timings.add_section(sys.modules[__name__], "update_scene")
+timings.add_section(sweeperlib, "draw_sprites")
+
+images = {}
+
+scene = {
+    "icons": 0,
+    "path": 0,
+    "generation": None,
+    "profile": [],
+    "profile_frames": 0
 }
 
-state = []
+PROFILE_FONT = "Courier New"
+#Frames between updates of the profiling overlay, so that it stays readable
+PROFILE_REFRESH = 30
 
-#---------------------------------Launch ducks------------------------------------------
-def launch():
-    """
-    Initializes the launch process by setting the x and y velocities 
-    of the duck based on the current angle and force. Marks the 
-    duck as being in flight.
-    """
-    angle_rad = game["angle"]
-        
-    x_velocity = -game["force"] * math.cos(angle_rad)
-    y_velocity = -game["force"] * math.sin(angle_rad)
-        
-    game["x_velocity"] = x_velocity
-    game["y_velocity"] = y_velocity
-    
-    game["flight"] = True
+OVERLAY_FONT = "Minecraft Standard"
+
+OVERLAY_BOX = {
+    "x": WIN_WIDTH / 2 - 150,
+    "y": WIN_HEIGHT / 2 - 100,
+    "width": 300,
+    "height": 180,
+    "color": (31, 169, 248),
+    "opacity": 250
+}
 
+MENU_LINES = [
+    {"text": "Choose mode...", "font_size": 16, "x": WIN_WIDTH // 2, "y": 230},
+    {"text": "P: Play levels", "font_size": 9, "x": WIN_WIDTH // 2, "y": 180 },
+    {"text": "R: Play random levels", "font_size": 9, "x": WIN_WIDTH // 2, "y": 150 },
+    {"text": "Q: Quit", "font_size": 9, "x": WIN_WIDTH // 2, "y": 120 }
+]
+
+WIN_LINES = [
+    {"text": "You win!", "font_size": 18, "x": WIN_WIDTH // 2, "y": WIN_HEIGHT // 2 + 40},
+    {"text": "R: Restart", "font_size": 9, "x": WIN_WIDTH // 2, "y": WIN_HEIGHT // 2 - 30},
+    {"text": "M: Menu", "font_size": 9, "x": WIN_WIDTH // 2, "y": WIN_HEIGHT // 2 - 50},
+    {"text": "Q: Quit", "font_size": 9, "x": WIN_WIDTH // 2, "y": WIN_HEIGHT // 2 - 70}
+]
+
+WIN_CONTINUE_LINES = WIN_LINES[:1] + [
+    {"text": "C: Continue", "font_size": 9, "x": WIN_WIDTH // 2, "y": WIN_HEIGHT // 2 - 10}
+] + WIN_LINES[1:]
+
+LOSE_LINES = [
+    {"text": "You lose!", "font_size": 20, "x": WIN_WIDTH // 2, "y": WIN_HEIGHT // 2 + 40},
+    {"text": "R: Restart", "font_size": 11, "x": WIN_WIDTH // 2, "y": WIN_HEIGHT // 2 - 10},
+    {"text": "M: Menu", "font_size": 11, "x": WIN_WIDTH // 2, "y": WIN_HEIGHT // 2 - 40},
+    {"text": "Q: Quit", "font_size": 11, "x": WIN_WIDTH // 2, "y": WIN_HEIGHT // 2 - 70}
+]
+
+#---------------------------------Input------------------------------------------
 def drag_handler(x, y, dx, dy, button, modifiers):
     """
     Handles the dragging of the duck by updating its position 
@@ -123,11 +154,9 @@ def drag_handler(x, y, dx, dy, button, modifiers):
         button (int): The mouse button being used for the drag.
         modifiers: Additional modifiers for the mouse input.
     """
-    if not game["flight"]:
-        game["dragging"] = True
-        game["x"] += dx
-        game["y"] += dy
-        game["x"], game["y"] = clamp_inside_circle(game["x"], game["y"], START_X, START_Y, 35)
+    if recorder:
+        recorder.drag(sim.ticks, x, y, dx, dy, button, modifiers)
+    sim.drag(dx, dy)
         
 def release_handler(x, y, button, modifiers):
     """
@@ -140,265 +169,146 @@ def release_handler(x, y, button, modifiers):
         button (int): The mouse button being used for the release.
         modifiers: Additional modifiers for the mouse input.
     """
-    if not game["flight"]: 
-        game["angle"] = calculate_angle(START_X, START_Y, game["x"], game["y"])
-        game["force"] = calculate_distance(game["x"], game["y"], START_X, START_Y)
-        launch()
-    game["dragging"] = False
-
-def clamp_inside_circle(x, y, x_center, y_center, rad):
-    """
-    Ensures a point remains inside a specified circle. If the point is 
-    outside the circle, it is clamped to the circle's boundary.
-
-    Parameters:
-        x (float): x-coordinate of the point.
-        y (float): y-coordinate of the point.
-        x_center (float): x-coordinate of the circle's center.
-        y_center (float): y-coordinate of the circle's center.
-        rad (float): Radius of the circle.
-
-    Returns:
-        tuple: The adjusted (x, y) coordinates, ensuring the point lies 
-               within or on the circle's boundary.
-    """
-    center_distance = calculate_distance(x, y, x_center, y_center)
+    if recorder:
+        recorder.release(sim.ticks, x, y, button, modifiers)
+    sim.release()
+
+#---------------------------------Scene------------------------------------------
+def load_images():
+    """
+    Gets the images of all game objects from the sweeperlib image cache once, 
+    so that the scene sprites can share them.
+    """
+    for key, name in (
+        ("sling", "sling.png"),
+        ("target", "target.png"),
+        ("obstacle", "obstacle.jpg"),
+        ("plank", "plank.png"),
+        ("duck", "duck.png"),
+        ("flight_path", "flight_path.png")
+    ):
+        images[key] = sweeperlib.load_background_image("sprites", name)
+
+def build_scene():
+    """
+    Replaces the scene with one sprite for every object of the current level: 
+    the sling, targets, obstacles, planks and the duck. Called whenever the 
+    simulation has filled the game state with a new level or round. The 
+    sprites are keyed by the id of the object they show.
+    """
+    sweeperlib.clear_scene()
+    sim.removed.clear()
+    scene["icons"] = 0
+    scene["path"] = 0
+    scene["generation"] = sim.generation
+    sweeperlib.place_sprite("sling", images["sling"], 50, GROUND_LEVEL, 1/2)
     
-    if center_distance > rad: 
-        ratio = rad / center_distance
-        new_x = ratio * (x - x_center) + x_center
-        new_y = ratio * (y - y_center) + y_center
-        return new_x, new_y
-    return x, y
-
-def calculate_angle(x1, y1, x2, y2):
-    """
-    Calculates the angle (in radians) between two points relative to the 
-    horizontal axis.
-
-    Parameters:
-        x1 (float): x-coordinate of the first point.
-        y1 (float): y-coordinate of the first point.
-        x2 (float): x-coordinate of the second point.
-        y2 (float): y-coordinate of the second point.
-
-    Returns:
-        float: The angle in radians.
-    """
-    return math.atan2(y2 - y1, x2 - x1)
+    for coin in game_state["targets"]:
+        sweeperlib.place_sprite(id(coin), images["target"], coin["x"], coin["y"], 1/10)
     
-#---------------------------------Collisions------------------------------------------
-def initial_state():
-    """
-    Puts the game back into its initial state: the duck is put back into the
-    launch position, its speed to zero, and its flight state to False.
-    """
-    if game_state["remaining_ducks"] > 0:
-        game_state["remaining_ducks"] -= 1
-        game["x"] = START_X
-        game["y"] = START_Y
-        game["angle"] = 0
-        game["force"] = 0
-        game["x_velocity"] = 0
-        game["y_velocity"] = 0
-        game["flight"] = False
-   
-def stop_duck():
-    """
-    Stops the duck's movement by setting its velocity to zero and ensuring 
-    it rests on the ground if below the ground level.
-    """
-    game["x_velocity"] = 0
-    game["y_velocity"] = 0
+    for box in game_state["obstacles"]:
+        sweeperlib.place_sprite(id(box), images["obstacle"], box["x"], box["y"], 1/20)
     
-    if game["y"] < GROUND_LEVEL:
-        game["y"] = GROUND_LEVEL
-
-def target_collision():
-    """
-    Checks if the duck has collided with any target. If a collision is 
-    detected, the target is removed, the duck is stopped, and a message 
-    is printed.
-    """
-    for coin in game_state["targets"]:
-        coin["radius"] = coin["w"] / 2
-        if calculate_distance(game["x"], game["y"], coin["x"], coin["y"]) <= coin["radius"]:
-            game_state["targets"].remove(coin)
-            print("Hit targets!")
-            stop_duck()
-            return
-
-def obstacle_collision():
-    """
-    Checks if the duck has collided with any obstacle. If a collision is 
-    detected, the duck is stopped and a message is printed.
-    """
-    for obstacle in game_state["obstacles"]:
-        if (
-            obstacle["x"] <= game["x"] <= obstacle["x"] + obstacle["w"] 
-            and obstacle["y"] <= game["y"] <= obstacle["y"] + obstacle["h"]
-        ):
-               print("Hit obstacle!")
-               stop_duck()
-               return
-
-def check_breakable_collision():
-    """
-    Checks if the duck has collided with any breakable obstacle. If a collision 
-    is detected, the obstacle is marked as falling, the duck is stopped, and a 
-    message is printed. It also propagates the falling state to anything above
-    falling obstacles.
-    """
     for plank in game_state["breakable_obstacles"]:
-        if (
-            plank["x"] <= game["x"] <= plank["x"] + plank["w"] 
-            and plank["y"] <= game["y"] <= plank["y"] + plank["h"]
-        ):
-            plank["falling"] = True
-            print("Hit obstacle!")
-            stop_duck()
-            return
+        rotation = 90 if plank["type"] == "horizontal" else 0
+        sweeperlib.place_sprite(id(plank), images["plank"], plank["x"], plank["y"], 1/3, rotation)
+    
+    sweeperlib.place_sprite(
+        "duck", images["duck"], game["x"], game["y"], 1/12, group="actor_group"
+    )
+
+def update_scene():
+    """
+    Moves the sprites of objects that can move (the duck, the ducks in flight 
+    in multi-shot mode, falling planks and the boxes of random levels), 
+    removes the sprites of destroyed objects and landed ducks and updates the 
+    remaining duck icons. Sprites that are already in place are left 
+    untouched. Moving objects are drawn at positions interpolated 
+    between simulation ticks. The scene is rebuilt if the simulation has 
+    loaded a new level or round since it was built.
+    """
+    if scene["generation"] != sim.generation:
+        build_scene()
+    
+    for entity in sim.removed:
+        sweeperlib.remove_sprite(id(entity))
+    sim.removed.clear()
+    
+    x, y = sim.interpolate("duck", game)
+    sweeperlib.place_sprite("duck", images["duck"], x, y)
+    
+    for duck in sim.projectiles.active:
+        x, y = sim.interpolate(id(duck), duck)
+        sweeperlib.place_sprite(
+            id(duck), images["duck"], x, y, 1/12, group="actor_group"
+        )
     
     for plank in game_state["breakable_obstacles"]:
         if plank["falling"]:
-            for other_plank in game_state["breakable_obstacles"]:
-                if not other_plank["falling"]:
-                    if (
-                        plank["x"] == other_plank["x"]  # Same vertical column
-                        or other_plank["type"] == "horizontal"  # Horizontal obstacles
-                        and plank["block"] == other_plank["block"]
-                    ):
-                        other_plank["falling"] = True
-
-def falling_obstacle():
-    """
-    Handles the behavior of falling breakable obstacles. Updates their vertical 
-    velocity and position. Checks for collisions with targets and removes any 
-    hit targets.
-    """
-    for plank in game_state["breakable_obstacles"]: 
-        if plank["falling"]:
-            plank["vy"] -= GRAVITATIONAL_ACC
-            plank["y"] += plank["vy"]
-              
-            for coin in game_state["targets"]:
-                coin["radius"] = coin["w"] / 2
-                if calculate_distance(plank["x"], plank["y"], coin["x"], coin["y"]) <= coin["radius"]:
-                    game_state["targets"].remove(coin)
-                    print("Hit targets!")
+            x, y = sim.interpolate(id(plank), plank)
+            sweeperlib.place_sprite(id(plank), images["plank"], x, y)
+    
+    if game_state["level"] == "random":
+        for coin in game_state["targets"]:
+            x, y = sim.interpolate(id(coin), coin)
+            sweeperlib.place_sprite(id(coin), images["target"], x, y)
+        for box in game_state["obstacles"]:
+            x, y = sim.interpolate(id(box), box)
+            sweeperlib.place_sprite(id(box), images["obstacle"], x, y)
+        update_duck_icons(game_state["remaining_ducks"])
+    else:
+        update_duck_icons(game_state["remaining_ducks"] - 1)
+    
+    if game["dragging"] and not game["flight"]:
+        update_flight_path(sim.predict_path())
+    else:
+        update_flight_path([])
 
-def calculate_distance(x1, y1, x2, y2):
+def update_flight_path(path):
     """
-    Calculates the Euclidean distance between two points.
+    Shows the aim preview as a dot at every point of the predicted path, 
+    moving the existing dots and adding or removing dots only when the 
+    number of points changes.
 
     Parameters:
-    x1 (float): x-coordinate of the first point.
-    y1 (float): y-coordinate of the first point.
-    x2 (float): x-coordinate of the second point.
-    y2 (float): y-coordinate of the second point.
-
-    Returns:
-    float: The distance between the two points.
-    """
-    distance = math.sqrt((x1 - x2)**2 + (y1 - y2)**2)
-    return distance
-
-#---------------------------------Random Stage------------------------------------------
-def create_items(obs_num, tar_num, min_height):
+        path (list): (x, y) points of the path, see Simulation.predict_path.
     """
-    Generates a list of random obstacles and targets and adds them to the 
-    game state.
-
-    Parameters:
-        obs_num (int): The number of obstacles to generate.
-        tar_num (int): The number of targets to generate.
-        min_height (int): The minimum y-coordinate for items to spawn.
+    #Centre the dots on the duck, which is drawn from its bottom left corner
+    dot = images["flight_path"]
+    dx = (images["duck"].width / 12 - dot.width) / 2
+    dy = (images["duck"].height / 12 - dot.height) / 2
+    for i in range(len(path), scene["path"]):
+        sweeperlib.remove_sprite(("path", i))
+    for i, (x, y) in enumerate(path):
+        sweeperlib.place_sprite(("path", i), dot, x + dx, y + dy)
+    scene["path"] = len(path)
 
-    Returns:
-        list: A combined list of all generated obstacles and targets.
+def draw_profile():
     """
-    items = []
-    
-    for _ in range(obs_num):
-        each_obs = {
-            "x": random.randint(340, WIN_WIDTH - 25),
-            "y": random.randint(min_height, WIN_HEIGHT - 26),
-            "w": 25,
-            "h": 26,
-            "vy": 0
-        }
-        items.append(each_obs)
-        game_state["obstacles"].append(each_obs)
-    
-    for _ in range(tar_num):
-        each_tar = {
-            "x": random.randint(340, WIN_WIDTH - 46),
-            "y": random.randint(min_height, WIN_HEIGHT - 46),
-            "w": 46,
-            "h": 46,
-            "vy": 0
-        }
-        items.append(each_tar)
-        game_state["targets"].append(each_tar)
-    return items
-
-def height_order(items_list):
-    """
-    Determines the height order of an item based on its top edge position.
-
-    Parameters:
-        items_list (dict): An item with properties including `y` and `h`.
-
-    Returns:
-        int: The sum of the `y` position and height of the item, indicating its 
-            top edge.
+    Shows the rolling frame and section times of the profiler in the top 
+    right corner of the window. The numbers are recalculated only every 
+    PROFILE_REFRESH frames.
     """
-    return items_list["y"] + items_list["h"]
+    if scene["profile_frames"] % PROFILE_REFRESH == 0:
+        scene["profile"] = timings.report_lines()
+    scene["profile_frames"] += 1
+    for i, line in enumerate(scene["profile"]):
+        sweeperlib.draw_text(line, WIN_WIDTH - 380, WIN_HEIGHT - 60 - i * 14, font=PROFILE_FONT, size=9)
 
-def drop(items):
+def update_duck_icons(count):
     """
-    Simulates the dropping of items under gravity, ensuring items rest on 
-    the ground or on top of each other.
+    Shows the given number of remaining duck icons at the top of the window, 
+    adding or removing icons only when the count changes.
 
     Parameters:
-        items (list): A list of items to be updated based on gravitational force.
+        count (int): The number of icons to show.
     """
-    items.sort(key=height_order)
-    
-    for i, block in enumerate(items):
-        #Apply gravity to y-velocity
-        block["vy"] += GRAVITATIONAL_ACC
-        
-        #Update new position
-        new_y = block["y"] - block["vy"]
-       
-        if new_y <= GROUND_LEVEL:
-            block["y"] = GROUND_LEVEL
-            block["vy"] = 0
-        else:
-            for j in range(i - 1, -1, -1):
-                other_block = items[j]
-                #Check if blocks fall on top of previous blocks
-                if (
-                    block["x"] < other_block["x"] + other_block["w"] 
-                    and other_block["x"] < block["x"] + block["w"] 
-                    and new_y <= other_block["y"] + other_block["h"]
-                ):
-                    block["y"] = other_block["y"] + other_block["h"]
-                    block["vy"] = 0
-                    break
-                block["y"] = new_y
-
-def create_new_round():
-    """
-    Sets up a new round in the game. Clears previous targets and obstacles, 
-    generates new ones, resets the duck count, and updates the game state 
-    to indicate a random level.
-    """
-    game_state["targets"].clear()
-    game_state["obstacles"].clear()
-    game_state["remaining_ducks"] = MAX_DUCKS
-    game_state["boxes"] = create_items(3, 3, WIN_HEIGHT // 2)
+    count = max(count, 0)
+    for i in range(count, scene["icons"]):
+        sweeperlib.remove_sprite(("icon", i))
+    for i in range(scene["icons"], count):
+        sweeperlib.place_sprite(("icon", i), images["duck"], i * 30, WIN_HEIGHT - 40, 1/12)
+    scene["icons"] = count
 
 #---------------------------------------------------------------------------------
 def draw():
@@ -409,438 +319,291 @@ def draw():
     This function handles:
     - Drawing the background and the main game window.
     - Rendering the menu screen when the game is in the "menu" state.
-    - Drawing the game elements like the sling, targets, obstacles, ducks, and 
-      flight paths for levels.
+    - The menu, win and lose texts are overlays that are laid out once when 
+      the screen is entered, not on every frame.
+    - Drawing the game elements like the sling, targets, obstacles and ducks 
+      for levels. These are kept as scene sprites in the sweeperlib batch, so 
+      only moved objects are updated and the whole level is drawn at once.
     - Displaying win and lose messages after completing a level or random rounds.
-    - Rendering the random levels, including obstacles and targets, based on 
-      the game state.
-    - Handling the rendering of remaining ducks, their positions, and other 
-      gameplay elements.
+    - Showing the profiler's timings on top of everything while it's enabled.
     """
+    started = timings.frame() if timings.enabled else None
     sweeperlib.clear_window()
-    sweeperlib.draw_background()
+    
+    if machine.current in PLAY_SCREENS:
+        update_scene()
     
     if game_state["level"] == "menu":
-        menu_items = [
-            {"text": "Choose mode...", "font_size": 16, "x": WIN_WIDTH // 2, "y": 230},
-            {"text": "P: Play levels", "font_size": 9, "x": WIN_WIDTH // 2, "y": 180 },
-            {"text": "R: Play random levels", "font_size": 9, "x": WIN_WIDTH // 2, "y": 150 },
-            {"text": "Q: Quit", "font_size": 9, "x": WIN_WIDTH // 2, "y": 120 }
-        ]
-        
-        #Draw box text
-        box = pyglet.shapes.Rectangle(
-                x=WIN_WIDTH / 2,
-                y=WIN_HEIGHT / 2 - 10,
-                width=300,
-                height=180,
-                color=(31, 169, 248)
-            )
-        box.anchor_x = 150
-        box.anchor_y = 90
-        box.opacity = 250
-        box.draw()
-        
-        #Add texts for command lines
-        for items in menu_items:
-            label = pyglet.text.Label(
-                items["text"],
-                font_name='Minecraft Standard',
-                font_size=items["font_size"],
-                x=items["x"],
-                y=items["y"],
-                anchor_x='center',
-                anchor_y='center',
-                color=(255, 255, 255, 255)
-            )
-            label.draw()
+        sweeperlib.show_overlay("menu", OVERLAY_BOX, MENU_LINES, font=OVERLAY_FONT)
+    
+    #Only show "C: Continue" option if there are next levels 
+    elif game_state["level"] == "win" and game_state["next_level"]:
+        sweeperlib.show_overlay("win_continue", OVERLAY_BOX, WIN_CONTINUE_LINES, font=OVERLAY_FONT)
+    
+    elif game_state["level"] == "win":
+        sweeperlib.show_overlay("win", OVERLAY_BOX, WIN_LINES, font=OVERLAY_FONT)
     
-    elif game_state["level"].startswith("level"): 
-        
-        #Load sling
-        sling = sweeperlib.load_background_image("sprites", "sling.png")
-        sling_sprites = pyglet.sprite.Sprite(sling, x=50, y=GROUND_LEVEL)
-        sling_sprites.scale = 1/2
-        sling_sprites.draw()
-       
-        #Load targets
-        for coin in game_state["targets"]:
-            target_img = sweeperlib.load_background_image("sprites", "target.png")
-            target_sprites = pyglet.sprite.Sprite(target_img, coin["x"], coin["y"])
-            target_sprites.scale = 1/10
-            target_sprites.draw()
-        
-        #Load obstacles for level 1
-        for box in game_state["obstacles"]:
-            obstacle_img = sweeperlib.load_background_image("sprites", "obstacle.jpg")
-            obstacle_sprites = pyglet.sprite.Sprite(obstacle_img, box["x"], box["y"])
-            obstacle_sprites.scale = 1/20
-            obstacle_sprites.draw() 
-        
-        #Load obstacles for level 2
-        for box in game_state["breakable_obstacles"]:
-            obstacle_img = sweeperlib.load_background_image("sprites", "plank.png")
-            obstacle_sprites = pyglet.sprite.Sprite(obstacle_img, box["x"], box["y"])
-            obstacle_sprites.scale = 1/3
-            if box["type"] == "horizontal":
-                obstacle_sprites.rotation = 90
-            obstacle_sprites.draw()
-        
-        #Load duck
-        duck_img = sweeperlib.load_background_image("sprites", "duck.png")
-        duck_sprites = pyglet.sprite.Sprite(duck_img, game["x"], game["y"])
-        duck_sprites.scale = 1/12
-        duck_sprites.draw()
-        
-        #Load remaining ducks 
-        for i in range(game_state["remaining_ducks"] - 1):
-            duck_img = sweeperlib.load_background_image("sprites", "duck.png")
-            remaining_duck = pyglet.sprite.Sprite(duck_img, x= i*30, y=WIN_HEIGHT-40)
-            remaining_duck.scale = 1/12
-            remaining_duck.draw()
-        
-    #Load win message for normal levels  
-    elif game_state["level"] == "win": 
-        win_strings = [
-            {"text": "You win!", "font_size": 18, "x": WIN_WIDTH // 2, "y": WIN_HEIGHT // 2 + 40},
-            {"text": "R: Restart", "font_size": 9, "x": WIN_WIDTH // 2, "y": WIN_HEIGHT // 2 - 30},
-            {"text": "M: Menu", "font_size": 9, "x": WIN_WIDTH // 2, "y": WIN_HEIGHT // 2 - 50},
-            {"text": "Q: Quit", "font_size": 9, "x": WIN_WIDTH // 2, "y": WIN_HEIGHT // 2 - 70}
-        ]
-        
-        #Only load "C: Continue" option if there are next levels 
-        if game_state["next_level"]:
-            win_strings.insert(
-                1, 
-                {"text": "C: Continue", "font_size": 9, "x": WIN_WIDTH // 2, "y": WIN_HEIGHT // 2 - 10}
-            )
-        
-        #Draw box text
-        box = pyglet.shapes.Rectangle(
-            x=WIN_WIDTH / 2,
-            y=WIN_HEIGHT / 2 - 10,
-            width=300,
-            height=180,
-            color=(31, 169, 248)
-        )
-        box.anchor_x = 150
-        box.anchor_y = 90
-        box.opacity = 250
-        box.draw()
-        
-        #Add texts for command lines
-        for string in win_strings:
-            label_win = pyglet.text.Label(
-                string["text"],
-                font_name='Minecraft Standard',
-                font_size=string["font_size"],
-                x=string["x"],
-                y=string["y"],
-                anchor_x='center',
-                anchor_y='center',
-                color=(255, 255, 255, 255)
-            )
-            label_win.draw()
-        
-    #Load lose message for normal levels           
     elif game_state["level"] == "lose":
-        lose_strings = [
-            {"text": "You lose!", "font_size": 20, "x": WIN_WIDTH // 2, "y": WIN_HEIGHT // 2 + 40},
-            {"text": "R: Restart", "font_size": 11, "x": WIN_WIDTH // 2, "y": WIN_HEIGHT // 2 + - 10},
-            {"text": "M: Menu", "font_size": 11, "x": WIN_WIDTH // 2, "y": WIN_HEIGHT // 2 - 40},
-            {"text": "Q: Quit", "font_size": 11, "x": WIN_WIDTH // 2, "y": WIN_HEIGHT // 2 - 70}
-        ]
-        
-        #Draw box text
-        box = pyglet.shapes.Rectangle(
-            x=WIN_WIDTH / 2,
-            y=WIN_HEIGHT / 2 - 10,
-            width=300,
-            height=180,
-            color=(31, 169, 248)
-        )
-        box.anchor_x = 150
-        box.anchor_y = 90
-        box.opacity = 250
-        box.draw()
-        
-        #Add texts for command lines
-        for string in lose_strings:
-            label_lose = pyglet.text.Label(
-                string["text"],
-                font_name='Minecraft Standard',
-                font_size=string["font_size"],
-                x=string["x"],
-                y=string["y"],
-                anchor_x='center',
-                anchor_y='center',
-                color=(255, 255, 255, 255)
-            )
-            label_lose.draw()
-        
-    elif game_state["level"] == "random":
-        #Load sling
-        sling = sweeperlib.load_background_image("sprites", "sling.png")
-        sling_sprites = pyglet.sprite.Sprite(sling, x=50, y=GROUND_LEVEL)
-        sling_sprites.scale = 1/2
-        sling_sprites.draw()
-       
-        #Load targets
-        for coin in game_state["targets"]:
-            target_img = sweeperlib.load_background_image("sprites", "target.png")
-            target_sprites = pyglet.sprite.Sprite(target_img, coin["x"], coin["y"])
-            target_sprites.scale = 1/10
-            target_sprites.draw()
-        
-        #Load obstacles for each level 
-        for box in game_state["obstacles"]:
-            obstacle_img = sweeperlib.load_background_image("sprites", "obstacle.jpg")
-            obstacle_sprites = pyglet.sprite.Sprite(obstacle_img, box["x"], box["y"])
-            obstacle_sprites.scale = 1/20
-            obstacle_sprites.draw() 
-        
-        #Load duck
-        duck_img = sweeperlib.load_background_image("sprites", "duck.png")
-        duck_sprites = pyglet.sprite.Sprite(duck_img, game["x"], game["y"])
-        duck_sprites.scale = 1/12
-        duck_sprites.draw()
-        
-        #Load remaining ducks 
-        for i in range(game_state["remaining_ducks"]):
-            duck_img = sweeperlib.load_background_image("sprites", "duck.png")
-            remaining_duck = pyglet.sprite.Sprite(duck_img, x= i*30, y=WIN_HEIGHT-40)
-            remaining_duck.scale = 1/12
-            remaining_duck.draw()
-        
-def load_level(level):
-    """
-    Loads a new level or state based on the provided level identifier.
-
-    This function:
-    - Loads a normal level by reading the level data from a JSON file and 
-      updating the game state (obstacles, targets, duck count, etc.).
-    - Handles transitions to win or lose states for both normal and random levels.
-    - Resets game elements (like ducks, obstacles, and targets) before loading 
-      a new level or state.
-    - In case of a win, it updates the game state with the next level to load.
+        sweeperlib.show_overlay("lose", OVERLAY_BOX, LOSE_LINES, font=OVERLAY_FONT)
+    
+    else:
+        sweeperlib.clear_overlay()
+    sweeperlib.draw_sprites()
     
-    It handles three types of levels:
-    - Normal levels (e.g., "level1.json").
-    - Random levels (e.g., "random").
-    - Special states for win/lose conditions.
+    if started is not None:
+        timings.record("draw", time.perf_counter() - started)
+        draw_profile()
+    
+def start_level(name):
+    """
+    Loads a level of the campaign by its name.
 
     Parameters:
-        level (str): A string representing the level to load. This can be a normal level 
-                    file (e.g., "level1.json"), a random level ("random"), or a special 
-                    game state ("win", "lose").
-    """
-    game_state["used_ducks"].clear()
-    game_state["obstacles"].clear()
-    game_state["targets"].clear()
-    game_state["breakable_obstacles"].clear()
-    
-    try:
-        if level == "win":
-            game_state["level"] = level
-            game_state["next_level"] = None
-        
-        # Normal levels
-        elif level.endswith(".json"):
-                try:
-                    with open(level) as file:
-                        data = json.load(file)
-                        game_state["level"] = level
-                        if level == "level1.json":
-                            game_state["obstacles"] = data["obstacles"].copy()
-                        else:
-                            game_state["breakable_obstacles"] = data["obstacles"].copy()
-                        game_state["targets"] = data["targets"].copy()
-                        game_state["remaining_ducks"] = data["ducks"]
-                        game_state["next_level"] = data["next_level"]
-                except IOError:
-                    print("Failed to load level.")
-    except AttributeError:
-        print("There are no more levels left!") #Catch errors for pressing C option
+        name (str): The level name, e.g. "level1", or None if there is no 
+            level to load.
 
-def keyboard_handler(symbol, modifiers):
+    Returns:
+        bool: Whether the level was loaded.
+    """
+    if name is None:
+        print("There is no level to play!")
+        return False
+    sim.load_level(registry.path(name))
+    game_state["level"] = name
+    game_state["next_level"] = registry.next(name)
+    game_state["is_random"] = False
+    campaign["level"] = name
+    return True
+
+def current_screen():
+    """
+    Gives the screen the game is on according to the game state, which the 
+    simulation also changes, e.g. when a level is won.
+
+    Returns:
+        str: The screen, one of SCREENS.
+    """
+    level = game_state["level"]
+    return level if level in SCREENS else "level"
+
+#---------------------------------Screens----------------------------------------
+#Actions of the transition table. Each one returns the screen to go to, or 
+#None to stay on the current screen.
+def quit_game():
+    """
+    Closes the game window.
+    """
+    sweeperlib.close()
+
+def go_to_menu():
+    """
+    Stops whatever is being played and returns to the menu. The duck is put 
+    back even if it was the last one, so that it can't land in the menu.
+    """
+    sim.reset_duck()
+    sim.clear_entities()
+    game_state["is_random"] = False
+    game_state["level"] = "menu"
+    game_state["round"] = 1
+    campaign["level"] = None
+    return "menu"
+
+def start_campaign():
+    """
+    Starts the campaign from its first level.
+    """
+    if not start_level(registry.first()):
+        return None
+    return "level"
+
+def start_random():
+    """
+    Starts a new run of random rounds.
+    """
+    sim.start_random_run()
+    game_state["level"] = "random"
+    game_state["is_random"] = True
+    return "random"
+
+def continue_campaign():
     """
-    Handles keyboard input events and updates the game state accordingly.
+    Continues to the next level of the campaign after a win, if there is one.
+    """
+    if not game_state["next_level"]:
+        print("There are no more levels left!")
+        return None
+    sim.reset_duck()
+    start_level(game_state["next_level"])
+    return "level"
+
+def restart():
+    """
+    Plays the campaign level or the random round again after a win or a 
+    loss. Random runs can only be restarted in their first round. The duck 
+    is put back even if the last one is still in flight.
+    """
+    if game_state["is_random"]:
+        if game_state["round"] != 1:
+            print("Only reset first round!")
+            return None
+        sim.reset_duck()
+        sim.create_new_round()
+        game_state["level"] = "random"
+        return "random"
+    if campaign["level"] is None:
+        print("There is no level to restart!")
+        return None
+    sim.reset_duck()
+    start_level(campaign["level"])
+    return "level"
+
+#Hooks run when screens are entered and left. They only prepare things 
+#ahead of time, so the game plays the same whenever they run.
+def warm_menu():
+    """
+    Reads the first levels of the campaign into the level cache, so that 
+    starting the campaign needs no disk access.
+    """
+    first = registry.first()
+    if first is not None:
+        registry.prefetch(first)
 
-    This function processes keypresses based on the current game state and 
-    takes actions such as navigating through menus, starting new levels, and 
-    restarting or quitting the game.
+def prefetch_next():
+    """
+    Reads the level after the current campaign level into the level cache, 
+    so that continuing to it is instant. Levels loaded from outside the 
+    campaign, e.g. by the benchmarks, have nothing to prefetch.
+    """
+    if campaign["level"] is not None:
+        registry.prefetch(campaign["level"])
+
+def prepare_restart():
+    """
+    Starts building the first round again in the background after a random 
+    run is lost in it, so that restarting it is instant.
+    """
+    if game_state["is_random"] and game_state["round"] == 1:
+        sim.prepare_round(1)
+
+def clear_play_scene():
+    """
+    Removes the sprites of the level or round being left.
+    """
+    sweeperlib.clear_scene()
+    scene["generation"] = None
+
+TRANSITIONS = {
+    **{(screen, KEYS.Q): quit_game for screen in SCREENS},
+    **{(screen, KEYS.M): go_to_menu for screen in SCREENS},
+    ("menu", KEYS.P): start_campaign,
+    ("menu", KEYS.R): start_random,
+    ("win", KEYS.C): continue_campaign,
+    ("win", KEYS.R): restart,
+    ("lose", KEYS.R): restart
+}
+
+machine = screens.ScreenMachine(
+    current_screen(),
+    TRANSITIONS,
+    enter={
+        "menu": warm_menu,
+        "level": prefetch_next,
+        "lose": prepare_restart
+    },
+    exit={
+        "level": clear_play_scene,
+        "random": clear_play_scene
+    }
+)
+
+def keyboard_handler(symbol, modifiers):
+    """
+    Handles keyboard input events by looking up the transition of the key 
+    on the current screen in TRANSITIONS.
 
     Key actions include:
+    - Pressing 'F3' to show or hide the profiler's timings.
     - Pressing 'Q' to quit the game.
     - Pressing 'M' to return to the main menu.
-    - Pressing 'P' to start playing a normal level.
+    - Pressing 'P' (in menu) to start playing the campaign.
     - Pressing 'R' (in menu) to start a random level.
     - Pressing 'C' to continue after winning a level.
-    - Pressing 'R' (in game command) to restart the current level 
-      or random round after losing.
-    - Pressing 'M' in the win/lose screens to return to the menu.
+    - Pressing 'R' after winning or losing to restart the current level 
+      or the first random round.
 
     Parameters:
         symbol (int): The key symbol (key code) of the pressed key.
         modifiers: Additional modifiers for the mouse input.
     """
-    global state
-    global CURRENT_ROUND
-    
-    if symbol == KEYS.Q:
-        sweeperlib.close()
-    
-    if symbol == KEYS.M:
-        initial_state()
-        game_state["targets"].clear()
-        game_state["obstacles"].clear()
-        game_state["is_random"] = False
-        game_state["level"] = "menu"
-        CURRENT_ROUND = 1
-        state.clear()
+    if symbol == KEYS.F3:
+        timings.toggle()
+        scene["profile_frames"] = 0
         return
-       
-    if game_state["level"] == "menu":
-        if symbol == KEYS.P:
-            #Load level 1
-            load_level("level1.json")
-            game_state["level"] = "level1"
-            game_state["next_level"] = "level2"
-            game_state["is_random"] = False
-            state.append("level1")
-            
-        elif symbol == KEYS.R:
-            #Load random stage
-            CURRENT_ROUND = 1
-            create_new_round()      
-            game_state["level"] = "random"
-            game_state["is_random"] = True
     
-    if game_state["level"] == "win":
-        try:
-            if symbol == KEYS.C:
-                #Proceed from level 1 to level 2
-                initial_state()
-                load_level("level2.json")
-                game_state["level"] = "level2"
-                state.append(game_state["level"])
-            
-            elif symbol == KEYS.R:
-                if game_state["is_random"] and CURRENT_ROUND == 1:
-                    #Reset random stage
-                    CURRENT_ROUND = 1
-                    create_new_round()
-                    game_state["level"] = "random"
-                    game_state["is_random"] = False
-                else:
-                    #Reset normal stage
-                    initial_state()
-                    game_state["is_random"] = False
-                    game_state["level"] = state[-1]
-                    load_level(game_state["level"] + ".json") 
-        except IndexError: 
-                print("Only reset first round!") 
-                #Catch error if resetting random stage in rounds other than first one                
-           
-    elif game_state["level"] == "lose":
-        try:
-            if symbol == KEYS.R:
-                #Reset random stage
-                if game_state["is_random"] and CURRENT_ROUND == 1:
-                    CURRENT_ROUND = 1
-                    create_new_round()
-                    game_state["level"] = "random"
-                    game_state["is_random"] = False
-                else:
-                    #Reset normal stage
-                    initial_state()
-                    game_state["level"] = state[-1]
-                    load_level(game_state["level"] + ".json")
-        except IndexError: 
-                print("Only reset first round!")
-                #Catch error if resetting random stage in rounds other than first one
+    if recorder:
+        recorder.key(sim.ticks, symbol, modifiers)
+    
+    machine.go(current_screen())
+    machine.handle(symbol)
 
 def update(elapsed_time):
-    if game_state["level"] == "random":
-        drop(game_state["boxes"])
-    
-    if game["flight"]:
-        game["y_velocity"] -= GRAVITATIONAL_ACC  
-        game["x"] += game["x_velocity"]
-        game["y"] += game["y_velocity"]
-        
-        #Collision for level 1
-        obstacle_collision()
-        target_collision()
-        if not game_state["targets"] and game_state["remaining_ducks"] >= 0:
-            if game_state["level"].startswith("level"):
-                game_state["is_random"] = False
-                game_state["level"] = "win"
-            else:
-                global CURRENT_ROUND
-                if CURRENT_ROUND < TOTAL_ROUNDS:
-                    CURRENT_ROUND += 1
-                    create_new_round()
-                else: 
-                    game_state["next_level"] = None
-                    game_state["level"] = "win"       
-        elif game_state["remaining_ducks"] == 0:
-            game_state["level"] = "lose"
-         
-        #Collision for level 2
-        check_breakable_collision()    
-        
-        if game["y"] <= GROUND_LEVEL:
-            game_state["used_ducks"].append({
-                "x": game["x"],
-                "y": game["y"],
-                "w": game["w"],
-                "h": game["h"],
-                "vy": 0
-            })
-            initial_state()
+    """
+    Advances the simulation by the elapsed time in fixed ticks, so the game 
+    runs at the same speed however often this is called. Physics, collisions 
+    and win/lose conditions are handled by simulation.Simulation.
+
+    Parameters:
+        elapsed_time (float): The amount of time elapsed since the last update, 
+        typically provided by the game loop.
     
-    #Falling obstacles destroy targets level 2
-    falling_obstacle()        
+    The screen machine then follows the simulation to the win or lose screen 
+    if the level has ended.
+    """
+    sim.advance(elapsed_time)
+    machine.go(current_screen())
 
-#-------------------Main-----------------------
-if __name__ == "__main__":
-    if game_state["level"] == "random":
-        create_new_round()
+def create_game_window():
+    """
+    Loads the sprites, creates the game window and sets the draw handler.
+    """
+    sweeperlib.preload_images("sprites")
     image = sweeperlib.load_background_image("sprites", "background.jpg")
     sweeperlib.create_window(width = WIN_WIDTH, height = WIN_HEIGHT, bg_image=image)
+    load_images()
     sweeperlib.load_duck("sprites")
     sweeperlib.set_draw_handler(draw)
+
+#-------------------Main-----------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="A Wee Bit Miffed Ducks")
+    parser.add_argument("--record", help="write the game's input into this replay file")
+    parser.add_argument(
+        "--multi-shot", action="store_true", 
+        help="launch the next duck without waiting for the previous ones to land"
+    )
+    parser.add_argument(
+        "--profile", 
+        help="time the game loop from the start and write the timings into this file (.csv or .json)"
+    )
+    args = parser.parse_args()
+    if args.profile:
+        timings.enable()
+    sim.multi_shot = args.multi_shot
+    if args.record:
+        #Seed the random runs so that the replay plays the same rounds
+        seed = random.getrandbits(32)
+        random.seed(seed)
+        recorder = replay.Recorder(args.record, seed, replay.MULTI_SHOT if args.multi_shot else 0)
+    
+    if game_state["level"] == "random":
+        sim.create_new_round()
+    create_game_window()
     sweeperlib.set_keyboard_handler(keyboard_handler)
-    sweeperlib.set_drag_handler(drag_handler)
+    sweeperlib.set_drag_handler(drag_handler, coalesce=True)
     sweeperlib.set_release_handler(release_handler)
     sweeperlib.set_interval_handler(update, 1/60)
     sweeperlib.start()
-"""
-    Updates the game state based on the elapsed time, handling physics, 
-    collisions, and transitions between game states.
-
-    This function executes the following logic:
-    - Updates the position of objects affected by gravity, such as blocks falling 
-      in the "random" level.
-    - Handles the flight mechanics of the duck, updating its position based on 
-      velocity and applying gravitational acceleration.
-    - Checks for collisions:
-        - Ducks with obstacles in level 1.
-        - Ducks with breakable obstacles in level 2.
-        - Ducks with targets across all levels.
-    - Manages the win condition:
-        - If all targets are cleared and ducks remain, the player wins, and 
-          the win message appears prompting users to choose next actions.
-        - If playing random levels, transitions to the next random level or 
-          ends the game if all rounds are completed.
-    - Manages the lose condition:
-        - If no ducks remain and targets are not cleared, the player loses and 
-          the lose message appears prompting users to choose next actions.
-    - Handles the physics for falling objects, including interactions where 
-      falling obstacles can destroy targets in level 2.
-      
-      Parameters:
-        elapsed_time (float): The amount of time elapsed since the last update, 
-        typically provided by the game loop.
-    """
\ No newline at end of file
+    if recorder:
+        recorder.close()
+    if args.profile:
+        timings.export(args.profile)
@@ -0,0 +1,247 @@
+"""
+Frame-time profiling for A Wee Bit Miffed Ducks.
+
+A Profiler keeps the most recent timings of named sections of the game loop
+(e.g. drawing, updating, collision checks) and gives their rolling
+percentiles. Sections are functions or methods that are wrapped in a timer
+only while the profiler is enabled: enabling it replaces each registered
+attribute with a timed wrapper, and disabling it puts the original back. A
+disabled profiler therefore adds nothing to the functions it watches.
+
+Timings can be shown on screen (see Profiler.report_lines) and exported as
+CSV or JSON with Profiler.export.
+"""
+
+import csv
+import json
+import time
+import functools
+from collections import deque
+
+# Number of most recent samples kept for every section, about ten seconds
+# at 60 frames per second
+WINDOW = 600
+
+PERCENTILES = (50, 95, 99)
+
+# Marks attributes that belonged to the class and not the object itself
+MISSING = object()
+
+def percentile(ordered, percent):
+    """
+    Gives a percentile of sorted samples, using the nearest-rank method.
+
+    Parameters:
+        ordered (list): The samples in ascending order.
+        percent (float): The percentile, between 0 and 100.
+
+    Returns:
+        float: The sample at the percentile, or 0 if there are no samples.
+    """
+    if not ordered:
+        return 0
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+class Profiler:
+    """
+    Times sections of the game loop and keeps rolling statistics of them.
+
+    Attributes:
+        enabled (bool): Whether sections are being timed.
+        window (int): Number of samples kept for every section.
+        samples (dict): The latest durations of every section in seconds,
+            as deques keyed by section name.
+        sections (list): The registered sections, as (owner, attribute,
+            name) tuples.
+        originals (dict): The attributes that were replaced by timers while
+            enabled, keyed by (id of owner, attribute).
+        last_frame (float): perf_counter() time of the previous frame, or
+            None.
+    """
+
+    def __init__(self, window=WINDOW):
+        self.enabled = False
+        self.window = window
+        self.samples = {}
+        self.sections = []
+        self.originals = {}
+        self.last_frame = None
+
+    def add_section(self, owner, attribute, name=None):
+        """
+        Registers a function to be timed while the profiler is enabled. The
+        owner can be a module, e.g. a function of sweeperlib, or an object,
+        e.g. a method of a Simulation. Callers must look the function up
+        through its owner (sweeperlib.draw_sprites(), self.step()) for the
+        timer to be used.
+
+        Parameters:
+            owner (object): The module or object the function belongs to.
+            attribute (str): Name of the function.
+            name (str): Name of the section, the attribute by default.
+        """
+        section = (owner, attribute, name or attribute)
+        self.sections.append(section)
+        if self.enabled:
+            self.wrap(*section)
+
+    def wrap(self, owner, attribute, name):
+        """
+        Replaces a function with a timed wrapper and remembers the original.
+
+        Parameters:
+            owner (object): The module or object the function belongs to.
+            attribute (str): Name of the function.
+            name (str): Name of the section.
+        """
+        self.originals[(id(owner), attribute)] = vars(owner).get(attribute, MISSING)
+        function = getattr(owner, attribute)
+        record = self.record
+        clock = time.perf_counter
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            started = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(name, clock() - started)
+
+        setattr(owner, attribute, timed)
+
+    def unwrap(self, owner, attribute):
+        """
+        Puts back a function that was replaced by wrap().
+
+        Parameters:
+            owner (object): The module or object the function belongs to.
+            attribute (str): Name of the function.
+        """
+        original = self.originals.pop((id(owner), attribute))
+        if original is MISSING:
+            delattr(owner, attribute)
+        else:
+            setattr(owner, attribute, original)
+
+    def enable(self):
+        """
+        Starts timing the registered sections.
+        """
+        if self.enabled:
+            return
+        self.enabled = True
+        self.last_frame = None
+        for section in self.sections:
+            self.wrap(*section)
+
+    def disable(self):
+        """
+        Stops timing and restores the original functions. Samples taken so
+        far are kept, so they can still be exported.
+        """
+        if not self.enabled:
+            return
+        self.enabled = False
+        for owner, attribute, _ in reversed(self.sections):
+            self.unwrap(owner, attribute)
+
+    def toggle(self):
+        """
+        Enables the profiler if it's disabled and disables it otherwise.
+
+        Returns:
+            bool: Whether the profiler is now enabled.
+        """
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+        return self.enabled
+
+    def record(self, name, seconds):
+        """
+        Adds a sample to a section.
+
+        Parameters:
+            name (str): Name of the section.
+            seconds (float): The duration.
+        """
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def frame(self):
+        """
+        Marks the start of a frame and records the time since the previous
+        one as the "frame" section. Call this once per drawn frame.
+
+        Returns:
+            float: The perf_counter() time the frame started at, for timing
+                   the rest of it.
+        """
+        now = time.perf_counter()
+        if self.last_frame is not None:
+            self.record("frame", now - self.last_frame)
+        self.last_frame = now
+        return now
+
+    def statistics(self):
+        """
+        Calculates the statistics of every section from its recent samples.
+
+        Returns:
+            dict: For every section name, a dictionary with "count", "mean",
+                  "max" and "p50", "p95" and "p99", times in milliseconds.
+        """
+        result = {}
+        for name, samples in self.samples.items():
+            ordered = sorted(samples)
+            stats = {
+                "count": len(ordered),
+                "mean": sum(ordered) / len(ordered) * 1000 if ordered else 0,
+                "max": ordered[-1] * 1000 if ordered else 0
+            }
+            for percent in PERCENTILES:
+                stats["p{}".format(percent)] = percentile(ordered, percent) * 1000
+            result[name] = stats
+        return result
+
+    def report_lines(self):
+        """
+        Formats the statistics as lines of text for an on-screen overlay,
+        one line per section, slowest first.
+
+        Returns:
+            list: The lines.
+        """
+        stats = self.statistics()
+        lines = ["{:<25} {:>7} {:>7} {:>7}".format("ms", "p50", "p95", "p99")]
+        for name in sorted(stats, key=lambda name: -stats[name]["p95"]):
+            section = stats[name]
+            lines.append("{:<25} {:>7.2f} {:>7.2f} {:>7.2f}".format(
+                name[:25], section["p50"], section["p95"], section["p99"]
+            ))
+        return lines
+
+    def export(self, path):
+        """
+        Writes the statistics into a file, as CSV if the file name ends with
+        ".csv" and as JSON otherwise.
+
+        Parameters:
+            path (str): Path of the file.
+        """
+        stats = self.statistics()
+        if path.endswith(".csv"):
+            fields = ["section", "count", "mean", "max"]
+            fields += ["p{}".format(percent) for percent in PERCENTILES]
+            with open(path, "w", newline="") as file:
+                writer = csv.DictWriter(file, fieldnames=fields)
+                writer.writeheader()
+                for name, section in sorted(stats.items()):
+                    writer.writerow(dict(section, section=name))
+        else:
+            with open(path, "w") as file:
+                json.dump(stats, file, indent=4)
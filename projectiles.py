@@ -0,0 +1,121 @@
+"""
+Projectile pool for the multi-shot mode of A Wee Bit Miffed Ducks.
+
+In the normal game there is one duck, kept in Simulation.game, and it has
+to land before the next one can be launched. In multi-shot mode every
+launched duck becomes a Projectile and the sling is loaded again at once,
+so several ducks can be in flight at the same time.
+
+The projectiles are created once, when the pool is made, and reused: a
+launch takes a free one and a landing gives it back. Projectiles use
+__slots__, so each one is a small fixed-size object instead of a
+dictionary. They can also be read and written like the `game` dictionary
+(projectile["x"]), so the collision code of the simulation works on both.
+"""
+
+# Most ducks that can be in flight at once
+MAX_PROJECTILES = 16
+
+class Projectile:
+    """
+    A duck in flight.
+
+    Attributes:
+        slot (int): Number of the projectile in its pool, which stays the
+            same for the projectile's whole lifetime.
+        x (float): x-coordinate.
+        y (float): y-coordinate.
+        w (float): Width, 0 like the duck in the sling.
+        h (float): Height.
+        x_velocity (float): Horizontal velocity in pixels per tick.
+        y_velocity (float): Vertical velocity in pixels per tick.
+        last_position (tuple): Where the projectile was before its last
+            move; the collision checks test the whole move from there.
+    """
+
+    __slots__ = ("slot", "x", "y", "w", "h", "x_velocity", "y_velocity", "last_position")
+
+    def __init__(self, slot):
+        self.slot = slot
+        self.reset(0, 0, 0, 0)
+
+    def reset(self, x, y, x_velocity, y_velocity):
+        """
+        Puts the projectile at a position with a velocity.
+
+        Parameters:
+            x (float): x-coordinate.
+            y (float): y-coordinate.
+            x_velocity (float): Horizontal velocity.
+            y_velocity (float): Vertical velocity.
+        """
+        self.x = x
+        self.y = y
+        self.w = 0
+        self.h = 0
+        self.x_velocity = x_velocity
+        self.y_velocity = y_velocity
+        self.last_position = (x, y)
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+class ProjectilePool:
+    """
+    A fixed number of projectiles, reused for every launch.
+
+    Attributes:
+        projectiles (list): Every projectile of the pool, by slot.
+        free (list): Slots of the projectiles that aren't in flight, used
+            as a stack.
+        active (list): The projectiles in flight, in the order they were
+            launched.
+    """
+
+    def __init__(self, capacity=MAX_PROJECTILES):
+        self.projectiles = [Projectile(slot) for slot in range(capacity)]
+        self.free = list(range(capacity - 1, -1, -1))
+        self.active = []
+
+    def launch(self, x, y, x_velocity, y_velocity):
+        """
+        Takes a free projectile and sets it flying.
+
+        Parameters:
+            x (float): x-coordinate to launch from.
+            y (float): y-coordinate to launch from.
+            x_velocity (float): Horizontal velocity.
+            y_velocity (float): Vertical velocity.
+
+        Returns:
+            Projectile: The launched projectile, or None if every projectile
+                        is already in flight.
+        """
+        if not self.free:
+            return None
+        projectile = self.projectiles[self.free.pop()]
+        projectile.reset(x, y, x_velocity, y_velocity)
+        self.active.append(projectile)
+        return projectile
+
+    def retire(self, projectile):
+        """
+        Gives a projectile that has landed back to the pool.
+
+        Parameters:
+            projectile (Projectile): The projectile.
+        """
+        self.active.remove(projectile)
+        self.free.append(projectile.slot)
+
+    def clear(self):
+        """
+        Gives every projectile back to the pool, e.g. when a new level is
+        loaded.
+        """
+        for projectile in self.active:
+            self.free.append(projectile.slot)
+        self.active.clear()
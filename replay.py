@@ -0,0 +1,278 @@
+"""
+Recording and playback of input for A Wee Bit Miffed Ducks.
+
+All gameplay comes from three handlers in main.py: drag_handler,
+release_handler and keyboard_handler. The Recorder writes every call to
+them into a file, stamped with the simulation tick it happened before.
+Because the simulation runs in fixed ticks and random runs are seeded, a
+Player feeding the same calls back in at the same ticks plays the game
+exactly the same way, which makes bugs and slow frames reproducible.
+
+A replay file is a header (HEADER: magic, version, the seed of the global
+random number generator and flags for game options, e.g. MULTI_SHOT)
+followed by fixed-width event records
+(EVENT), which are appended and flushed as they happen, so a recording is
+usable even if the game crashes.
+
+Record a game with
+
+    python main.py --record game.rpl
+
+and play it back in a window, or headless at full speed:
+
+    python replay.py game.rpl
+    python replay.py --headless game.rpl other.rpl
+"""
+
+import sys
+import time
+import random
+import struct
+import argparse
+import importlib
+
+MAGIC = b"DUCKRPL\0"
+VERSION = 2
+
+# magic, version, seed, flags
+HEADER = struct.Struct("<8sHQI")
+# tick, event type, four numbers (x, y, dx, dy) and two integers
+# (button/symbol, modifiers)
+EVENT = struct.Struct("<IB4fII")
+
+DRAG = 0
+RELEASE = 1
+KEY = 2
+
+# Header flags
+MULTI_SHOT = 1
+
+class Recorder:
+    """
+    Writes input events into a replay file as they happen.
+
+    Attributes:
+        file (file): The replay file, open for writing.
+        seed (int): The seed written into the header.
+        flags (int): The flags written into the header.
+    """
+
+    def __init__(self, path, seed, flags=0):
+        self.seed = seed
+        self.flags = flags
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, seed, flags))
+        self.file.flush()
+
+    def write(self, tick, kind, numbers=(0, 0, 0, 0), button=0, modifiers=0):
+        """
+        Appends an event to the file.
+
+        Parameters:
+            tick (int): The number of ticks the simulation had run.
+            kind (int): DRAG, RELEASE or KEY.
+            numbers (tuple): The event's coordinates, up to four.
+            button (int): The mouse button or key symbol.
+            modifiers (int): The modifier keys.
+        """
+        self.file.write(EVENT.pack(tick, kind, *numbers, button, modifiers))
+        self.file.flush()
+
+    def drag(self, tick, x, y, dx, dy, button, modifiers):
+        """
+        Records a call to drag_handler.
+        """
+        self.write(tick, DRAG, (x, y, dx, dy), button, modifiers)
+
+    def release(self, tick, x, y, button, modifiers):
+        """
+        Records a call to release_handler.
+        """
+        self.write(tick, RELEASE, (x, y, 0, 0), button, modifiers)
+
+    def key(self, tick, symbol, modifiers):
+        """
+        Records a call to keyboard_handler.
+        """
+        self.write(tick, KEY, button=symbol, modifiers=modifiers)
+
+    def close(self):
+        """
+        Closes the replay file.
+        """
+        self.file.close()
+
+def read_replay(path):
+    """
+    Reads a replay file. A half-written event at the end of the file, e.g.
+    after a crash, is left out.
+
+    Parameters:
+        path (str): Path of the replay file.
+
+    Returns:
+        tuple: The seed, the flags and the events, as tuples of (tick, kind,
+               x, y, dx, dy, button, modifiers).
+
+    Raises:
+        ValueError: If the file isn't a replay file of a known version.
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    if len(data) < HEADER.size:
+        raise ValueError("Not a replay file")
+    magic, version, seed, flags = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a replay file of version {}".format(VERSION))
+
+    end = HEADER.size + (len(data) - HEADER.size) // EVENT.size * EVENT.size
+    return seed, flags, list(EVENT.iter_unpack(data[HEADER.size:end]))
+
+class Player:
+    """
+    Feeds the events of a replay file back into the game's handlers at the
+    ticks they were recorded at.
+
+    Attributes:
+        seed (int): The seed of the recording.
+        flags (int): The flags of the recording.
+        events (list): The events, see read_replay.
+        position (int): Index of the next event to play.
+        handlers (dict): The functions to call for DRAG, RELEASE and KEY
+            events, with the same parameters as the handlers in main.py.
+    """
+
+    def __init__(self, path, handlers):
+        self.seed, self.flags, self.events = read_replay(path)
+        self.position = 0
+        self.handlers = handlers
+
+    @property
+    def finished(self):
+        """
+        True once every event has been played.
+        """
+        return self.position >= len(self.events)
+
+    def feed(self, tick):
+        """
+        Plays the events recorded before the given tick. Meant to be called
+        before each tick, e.g. as the on_tick function of
+        Simulation.advance.
+
+        Parameters:
+            tick (int): The number of ticks the simulation has run.
+        """
+        events = self.events
+        while self.position < len(events) and events[self.position][0] <= tick:
+            _, kind, x, y, dx, dy, button, modifiers = events[self.position]
+            self.position += 1
+            if kind == DRAG:
+                self.handlers[DRAG](x, y, dx, dy, button, modifiers)
+            elif kind == RELEASE:
+                self.handlers[RELEASE](x, y, button, modifiers)
+            elif kind == KEY:
+                self.handlers[KEY](button, modifiers)
+
+def handlers(game, headless=False):
+    """
+    Gives the handlers of main.py in the form Player wants them. Headless,
+    the quit key is left out, since there is no window to close.
+
+    Parameters:
+        game (module): The main module.
+        headless (bool): Whether the replay is played without a window.
+
+    Returns:
+        dict: The handlers for DRAG, RELEASE and KEY events.
+    """
+    def key(symbol, modifiers):
+        if not (headless and symbol == game.KEYS.Q):
+            game.keyboard_handler(symbol, modifiers)
+
+    return {
+        DRAG: game.drag_handler,
+        RELEASE: game.release_handler,
+        KEY: key
+    }
+
+def play_headless(path, extra_ticks=600):
+    """
+    Plays a replay without a window as fast as possible, running ticks
+    directly instead of waiting for real time. The main module is loaded
+    again for every replay, so each one starts from a new game.
+
+    Parameters:
+        path (str): Path of the replay file.
+        extra_ticks (int): Ticks to keep running after the last event, so
+            that the last shot can finish.
+
+    Returns:
+        dict: "ticks", the number of ticks run, "seconds", how long it took,
+              and "game_state" and "game", the state at the end.
+    """
+    main = importlib.reload(importlib.import_module("main"))
+
+    player = Player(path, handlers(main, headless=True))
+    random.seed(player.seed)
+    sim = main.sim
+    sim.verbose = False
+    sim.multi_shot = bool(player.flags & MULTI_SHOT)
+    started = time.perf_counter()
+    while not player.finished:
+        player.feed(sim.ticks)
+        sim.step()
+    for _ in range(extra_ticks):
+        sim.step()
+    return {
+        "ticks": sim.ticks,
+        "seconds": time.perf_counter() - started,
+        "game_state": sim.game_state,
+        "game": sim.game
+    }
+
+def play_window(path):
+    """
+    Plays a replay in the game window in real time. Like main.update, the
+    screens follow the simulation after every update, so that the level is
+    drawn and the win and lose screens are shown.
+
+    Parameters:
+        path (str): Path of the replay file.
+    """
+    import main
+    import sweeperlib
+
+    player = Player(path, handlers(main))
+    random.seed(player.seed)
+    main.sim.multi_shot = bool(player.flags & MULTI_SHOT)
+    main.create_game_window()
+
+    def update(elapsed):
+        main.sim.advance(elapsed, player.feed)
+        main.machine.go(main.current_screen())
+
+    sweeperlib.set_interval_handler(update, 1/60)
+    sweeperlib.start()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plays recorded games.")
+    parser.add_argument("replays", nargs="+", help="replay files")
+    parser.add_argument("--headless", action="store_true", help="play without a window at full speed")
+    args = parser.parse_args()
+
+    if not args.headless:
+        play_window(args.replays[0])
+        sys.exit(0)
+
+    # No display is needed for headless playback, e.g. on a server
+    import pyglet
+    pyglet.options["headless"] = True
+
+    for name in args.replays:
+        result = play_headless(name)
+        state = result["game_state"]
+        print("{}: {} ticks in {:.3f} s, level {}, {} targets left, {} ducks left".format(
+            name, result["ticks"], result["seconds"], state["level"],
+            len(state["targets"]), state["remaining_ducks"]
+        ))
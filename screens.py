@@ -0,0 +1,71 @@
+"""
+Screen state machine for the frontend of A Wee Bit Miffed Ducks.
+
+The game is always on one screen, e.g. the menu or a level being played.
+Key presses move between screens through a transition table keyed by
+(screen, key): the entry is an action that does the work of the transition
+and gives the screen to go to. Screens can have enter and exit hooks, which
+are run whenever the screen changes, whether the change came from a key or
+from the simulation (e.g. a level being won). Hooks are meant for work that
+prepares a screen ahead of time, like reading levels into the cache, so
+they must not change how the game plays.
+"""
+
+class ScreenMachine:
+    """
+    Keeps track of the current screen and runs its transitions and hooks.
+
+    Attributes:
+        current (str): The current screen.
+        transitions (dict): Actions keyed by (screen, key). An action takes
+            no parameters and returns the screen to go to, or None to stay
+            on the current one.
+        enter (dict): Hooks run when a screen is entered, keyed by screen.
+        exit (dict): Hooks run when a screen is left, keyed by screen.
+    """
+
+    def __init__(self, initial, transitions, enter=None, exit=None):
+        self.current = initial
+        self.transitions = transitions
+        self.enter = enter or {}
+        self.exit = exit or {}
+        hook = self.enter.get(initial)
+        if hook is not None:
+            hook()
+
+    def go(self, screen):
+        """
+        Moves to a screen, running the exit hook of the current screen and
+        the enter hook of the new one. Going to the current screen does
+        nothing.
+
+        Parameters:
+            screen (str): The screen to go to.
+        """
+        if screen == self.current:
+            return
+        hook = self.exit.get(self.current)
+        if hook is not None:
+            hook()
+        self.current = screen
+        hook = self.enter.get(screen)
+        if hook is not None:
+            hook()
+
+    def handle(self, key):
+        """
+        Runs the transition of a key on the current screen, if it has one.
+
+        Parameters:
+            key (int): The key symbol.
+
+        Returns:
+            bool: Whether the key had a transition.
+        """
+        action = self.transitions.get((self.current, key))
+        if action is None:
+            return False
+        screen = action()
+        if screen is not None:
+            self.go(screen)
+        return True
@@ -0,0 +1,1386 @@
+"""
+Simulation core for A Wee Bit Miffed Ducks.
+
+This module holds the game state and everything that changes it: launching
+the duck, gravity, collisions, falling planks, random rounds and the win and
+lose conditions. Falling planks and the boxes of random rounds are stacked
+with stacking.StackSolver. It doesn't import pyglet or sweeperlib, so it can
+be run without a window, e.g. in tests or batch jobs that need to step the
+physics thousands of times per second. The pyglet frontend in main.py only forwards
+input to a Simulation and draws its state.
+
+Example:
+
+    sim = Simulation(verbose=False)
+    sim.load_level("level1.json")
+    sim.drag(-30, -10)
+    sim.release()
+    for _ in range(120):
+        sim.step()
+"""
+
+import math
+import random
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import generator
+import geometry
+import levelfile
+import levels
+import spatial
+import entitystore
+import projectiles
+import stacking
+
+WIN_WIDTH = 626
+WIN_HEIGHT = 376
+START_X = 50
+START_Y = 110
+GROUND_LEVEL = 85
+FORCE_FACTOR = 0.6
+GRAVITATIONAL_ACC = 1.5
+MAX_DUCKS = 10
+TOTAL_ROUNDS = 3
+SLING_RADIUS = 35
+
+# Length of one physics tick in seconds. Velocities are given in pixels per
+# tick and accelerations in pixels per tick squared.
+TICK = 1 / 60
+# Most ticks advance() runs for one call. If the game falls further behind,
+# the rest of the elapsed time is dropped instead of trying to catch up.
+MAX_CATCH_UP_STEPS = 5
+# Most ticks build_round() lets the items of a new round fall before handing
+# them over, in case something never comes to rest.
+MAX_SETTLE_TICKS = 600
+# Ticks between the points of the aim preview, and the most ticks it looks
+# ahead.
+PREVIEW_SPACING = 3
+MAX_PREVIEW_TICKS = 600
+
+# Most landed ducks kept in game_state["used_ducks"]; older ones are dropped
+MAX_DEBRIS = 64
+
+def clamp_inside_circle(x, y, x_center, y_center, rad):
+    """
+    Ensures a point remains inside a specified circle. If the point is
+    outside the circle, it is clamped to the circle's boundary.
+
+    Parameters:
+        x (float): x-coordinate of the point.
+        y (float): y-coordinate of the point.
+        x_center (float): x-coordinate of the circle's center.
+        y_center (float): y-coordinate of the circle's center.
+        rad (float): Radius of the circle.
+
+    Returns:
+        tuple: The adjusted (x, y) coordinates, ensuring the point lies
+               within or on the circle's boundary.
+    """
+    center_distance = calculate_distance(x, y, x_center, y_center)
+
+    if center_distance > rad:
+        ratio = rad / center_distance
+        new_x = ratio * (x - x_center) + x_center
+        new_y = ratio * (y - y_center) + y_center
+        return new_x, new_y
+    return x, y
+
+def calculate_angle(x1, y1, x2, y2):
+    """
+    Calculates the angle (in radians) between two points relative to the
+    horizontal axis.
+
+    Parameters:
+        x1 (float): x-coordinate of the first point.
+        y1 (float): y-coordinate of the first point.
+        x2 (float): x-coordinate of the second point.
+        y2 (float): y-coordinate of the second point.
+
+    Returns:
+        float: The angle in radians.
+    """
+    return math.atan2(y2 - y1, x2 - x1)
+
+def calculate_distance(x1, y1, x2, y2):
+    """
+    Calculates the Euclidean distance between two points.
+
+    Parameters:
+    x1 (float): x-coordinate of the first point.
+    y1 (float): y-coordinate of the first point.
+    x2 (float): x-coordinate of the second point.
+    y2 (float): y-coordinate of the second point.
+
+    Returns:
+    float: The distance between the two points.
+    """
+    distance = math.sqrt((x1 - x2)**2 + (y1 - y2)**2)
+    return distance
+
+def launch_velocity(x, y):
+    """
+    Calculates the velocity a duck released at a position in the sling is
+    launched with, the same way Simulation.release does.
+
+    Parameters:
+        x (float): x-coordinate of the duck in the sling.
+        y (float): y-coordinate of the duck in the sling.
+
+    Returns:
+        tuple: The (x, y) velocity in pixels per tick.
+    """
+    angle = calculate_angle(START_X, START_Y, x, y)
+    force = calculate_distance(x, y, START_X, START_Y)
+    return -force * math.cos(angle), -force * math.sin(angle)
+
+def flight_position(x0, y0, x_velocity, y_velocity, ticks):
+    """
+    Calculates where a duck is after a number of ticks of flight, in closed
+    form. Gravity is applied to the velocity before each move, like in
+    Simulation.step, so this gives exactly the positions the duck will have.
+
+    Parameters:
+        x0 (float): x-coordinate of the launch position.
+        y0 (float): y-coordinate of the launch position.
+        x_velocity (float): x-velocity at launch in pixels per tick.
+        y_velocity (float): y-velocity at launch in pixels per tick.
+        ticks (int): The number of ticks flown.
+
+    Returns:
+        tuple: The (x, y) position.
+    """
+    return (
+        x0 + x_velocity * ticks,
+        y0 + y_velocity * ticks - GRAVITATIONAL_ACC * ticks * (ticks + 1) / 2
+    )
+
+def landing_tick(y0, y_velocity):
+    """
+    Calculates the first tick after which a duck is at or below the ground,
+    by solving the flight's height for GROUND_LEVEL.
+
+    Parameters:
+        y0 (float): y-coordinate of the launch position.
+        y_velocity (float): y-velocity at launch in pixels per tick.
+
+    Returns:
+        int: The tick the duck lands on.
+    """
+    # y0 + v*n - g*n*(n+1)/2 <= ground  <=>  g/2*n^2 + (g/2 - v)*n + (ground - y0) >= 0.
+    # The duck is only checked after it has moved, so it can be released
+    # below the ground and still fly.
+    if flight_position(0, y0, 0, y_velocity, 1)[1] <= GROUND_LEVEL:
+        return 1
+    a = GRAVITATIONAL_ACC / 2
+    b = a - y_velocity
+    c = GROUND_LEVEL - y0
+    ticks = max(1, math.ceil((-b + math.sqrt(b * b - 4 * a * c)) / (2 * a)))
+    # Step back or forward over rounding errors at the boundary
+    while ticks > 1 and flight_position(0, y0, 0, y_velocity, ticks - 1)[1] <= GROUND_LEVEL:
+        ticks -= 1
+    while flight_position(0, y0, 0, y_velocity, ticks)[1] > GROUND_LEVEL:
+        ticks += 1
+    return ticks
+
+def swept_box_hit(x0, y0, x1, y1, box):
+    """
+    Checks if a point moving from (x0, y0) to (x1, y1) hit a box during the
+    move. If the point already started inside the box, only its end position
+    counts, so that an object resting in or sliding through a box isn't
+    stopped at the start of every move.
+
+    Parameters:
+        x0 (float): x-coordinate where the move started.
+        y0 (float): y-coordinate where the move started.
+        x1 (float): x-coordinate where the move ended.
+        y1 (float): y-coordinate where the move ended.
+        box (dict): A box with properties `x`, `y`, `w` and `h`.
+
+    Returns:
+        float: Time of impact between 0 and 1, or None if there was no hit.
+    """
+    if geometry.point_in_box(x0, y0, box["x"], box["y"], box["w"], box["h"]):
+        if geometry.point_in_box(x1, y1, box["x"], box["y"], box["w"], box["h"]):
+            return 1.0
+        return None
+    return geometry.segment_box_toi(x0, y0, x1, y1, box["x"], box["y"], box["w"], box["h"])
+
+def swept_circle_hit(x0, y0, x1, y1, x_center, y_center, radius):
+    """
+    Checks if a point moving from (x0, y0) to (x1, y1) hit a circle during
+    the move. Like in swept_box_hit, a move that starts inside the circle
+    only counts if it also ends inside it.
+
+    Parameters:
+        x0 (float): x-coordinate where the move started.
+        y0 (float): y-coordinate where the move started.
+        x1 (float): x-coordinate where the move ended.
+        y1 (float): y-coordinate where the move ended.
+        x_center (float): x-coordinate of the circle's center.
+        y_center (float): y-coordinate of the circle's center.
+        radius (float): Radius of the circle.
+
+    Returns:
+        float: Time of impact between 0 and 1, or None if there was no hit.
+    """
+    if calculate_distance(x0, y0, x_center, y_center) <= radius:
+        if calculate_distance(x1, y1, x_center, y_center) <= radius:
+            return 1.0
+        return None
+    return geometry.segment_circle_toi(x0, y0, x1, y1, x_center, y_center, radius)
+
+def box_bounds(entity):
+    """
+    Returns the bounding box of a box-shaped object (obstacle or plank).
+
+    Parameters:
+        entity (dict): An object with properties `x`, `y`, `w` and `h`.
+
+    Returns:
+        tuple: The box as (left, bottom, width, height).
+    """
+    return entity["x"], entity["y"], entity["w"], entity["h"]
+
+def target_bounds(entity):
+    """
+    Returns the bounding box of a target. Targets are hit inside a circle
+    with a radius of half their width around their position.
+
+    Parameters:
+        entity (dict): A target with properties `x`, `y` and `w`.
+
+    Returns:
+        tuple: The box as (left, bottom, width, height).
+    """
+    radius = entity["w"] / 2
+    return entity["x"] - radius, entity["y"] - radius, entity["w"], entity["w"]
+
+INDEXED = {
+    "obstacles": box_bounds,
+    "targets": target_bounds,
+    "breakable_obstacles": box_bounds
+}
+
+# The game state list a level's obstacles go to, by the level's
+# `obstacle_type`
+OBSTACLE_KINDS = {
+    "solid": "obstacles",
+    "breakable": "breakable_obstacles"
+}
+
+def round_random(seed, round_number):
+    """
+    Creates the random number generator for one round of a run of random
+    rounds. The same seed and round always give the same generator, so runs
+    can be played again.
+
+    Parameters:
+        seed (int): The seed of the run.
+        round_number (int): The round, starting from 1.
+
+    Returns:
+        random.Random: The generator for the round.
+    """
+    return random.Random(f"{seed}:{round_number}")
+
+def build_round(seed, round_number, settled_rounds=False):
+    """
+    Generates the obstacles and targets of one random round and lets them
+    fall until they're all resting. Doesn't touch any game state, so it can
+    be run in a worker thread while another round is being played.
+
+    Parameters:
+        seed (int): The seed of the run.
+        round_number (int): The round, starting from 1.
+        settled_rounds (bool): Whether to use generator.settled_items, whose
+            layouts don't need to fall at all.
+
+    Returns:
+        tuple: The obstacles and the targets, as two lists.
+    """
+    rng = round_random(seed, round_number)
+    if settled_rounds:
+        return generator.settled_items(
+            rng.getrandbits(32), 3, 3, 1.0, 340, WIN_WIDTH, GROUND_LEVEL, WIN_HEIGHT
+        )
+
+    scratch = Simulation(verbose=False)
+    items = scratch.create_items(3, 3, WIN_HEIGHT // 2, rng)
+    for _ in range(MAX_SETTLE_TICKS):
+        scratch.drop(items)
+        if not scratch.settling["stack"].awake:
+            break
+    return scratch.game_state["obstacles"], scratch.game_state["targets"]
+
+class Simulation:
+    """
+    Owns the state of one game and advances it one step at a time.
+
+    The state is kept in two dictionaries with the same layout the game has
+    always used: `game` for the duck in the sling or in flight and
+    `game_state` for the level (targets, obstacles, ducks left, current
+    screen, etc.). Frontends read them to draw the game. In multi-shot mode
+    launched ducks fly as projectiles (see projectiles.ProjectilePool)
+    instead, and `game` only holds the duck in the sling.
+
+    Attributes:
+        game (dict): The duck's position, velocity and flight state.
+        game_state (dict): The level's entities and progress.
+        removed (list): Entities destroyed since the frontend last emptied
+            the list, so it can drop whatever it drew for them.
+        generation (int): Incremented whenever a new level or round replaces
+            the entities, so frontends know to rebuild their scene.
+        accumulator (float): Elapsed time not yet simulated by advance().
+        ticks (int): The number of ticks run so far.
+        previous (dict): Positions of moving objects before the last tick,
+            keyed like in interpolate().
+        last_position (tuple): Where the duck was before its last move; the
+            collision checks test the whole move from there.
+        index (dict): A spatial.SpatialGrid for each kind of object in
+            INDEXED, used by the collision checks instead of scanning the
+            whole lists.
+        support (dict): The planks grouped by column and block, see
+            build_support_graph().
+        plank_stack (StackSolver): Lets the planks that have been knocked
+            loose fall and pile up, see build_plank_stack().
+        stores (dict): An entitystore.EntityStore for each kind of object
+            in INDEXED if the simulation uses NumPy, otherwise empty. When
+            in use, the stores replace the spatial index.
+        settling (dict): The boxes of a random round and the stacking solver
+            that moves them, see track_boxes().
+        settled_rounds (bool): Whether random rounds are generated with
+            generator.settled_items() instead of create_items().
+        seed (int): Seed used for every run of random rounds, or None to
+            pick a new one for each run. The seed of the current run is kept
+            in game_state["seed"].
+        background (bool): Whether the next random round is built in a
+            worker thread while the current one is played.
+        executor (ThreadPoolExecutor): The worker thread, started the first
+            time it's needed.
+        pending (tuple): (seed, round) of the round being built in the
+            background and its Future, or None.
+        levels (levels.LevelCache): The levels loaded so far. Can be shared
+            between simulations.
+        preview (dict): The last aim preview and what it was calculated for,
+            see predict_path().
+        multi_shot (bool): Whether launched ducks become projectiles, so
+            that the next duck can be launched while they fly.
+        projectiles (ProjectilePool): The ducks in flight in multi-shot
+            mode.
+        verbose (bool): Whether hits are printed.
+    """
+
+    def __init__(self, verbose=True, use_numpy=False, settled_rounds=False, seed=None,
+                 background=False, level_cache=None, multi_shot=False):
+        self.game = {
+            "x": START_X,
+            "y": START_Y,
+            "w": 0,
+            "h": 0,
+            "angle": 0,
+            "force": 0,
+            "x_velocity": 0,
+            "y_velocity": 0,
+            "flight": False,
+            "dragging": False
+        }
+        self.game_state = {
+            "targets": [],
+            "obstacles": [],
+            "breakable_obstacles": [],
+            "boxes": [],
+            "used_ducks": deque(maxlen=MAX_DEBRIS),
+            "remaining_ducks": MAX_DUCKS,
+            "level": "menu",
+            "next_level": None,
+            "is_random": False,
+            "round": 1,
+            "seed": None
+        }
+        self.removed = []
+        self.generation = 0
+        self.accumulator = 0
+        self.ticks = 0
+        self.previous = {}
+        self.last_position = (START_X, START_Y)
+        self.index = {kind: spatial.SpatialGrid() for kind in INDEXED}
+        self.support = {
+            "columns": {},
+            "blocks": {}
+        }
+        self.plank_stack = stacking.StackSolver(GROUND_LEVEL, GRAVITATIONAL_ACC)
+        self.stores = {}
+        self.settling = {
+            "items": None,
+            "kinds": {},
+            "stack": stacking.StackSolver(GROUND_LEVEL, GRAVITATIONAL_ACC, separate=True)
+        }
+        self.use_numpy = use_numpy
+        self.settled_rounds = settled_rounds
+        self.seed = seed
+        self.background = background
+        self.executor = None
+        self.pending = None
+        self.levels = level_cache if level_cache is not None else levels.LevelCache()
+        self.preview = {
+            "key": None,
+            "path": []
+        }
+        self.multi_shot = multi_shot
+        self.projectiles = projectiles.ProjectilePool()
+        self.verbose = verbose
+        if use_numpy and not entitystore.AVAILABLE:
+            raise ImportError("use_numpy needs NumPy to be installed")
+
+    def log(self, message):
+        """
+        Prints a message about the game if the simulation is verbose.
+
+        Parameters:
+            message (str): The message to print.
+        """
+        if self.verbose:
+            print(message)
+
+    #---------------------------------Spatial index-------------------------------------
+    def build_index(self):
+        """
+        Rebuilds the spatial index, or the entity stores if the simulation
+        uses NumPy, from the objects in the game state. Called whenever a
+        level or round is loaded.
+        """
+        if self.use_numpy:
+            self.stores = {
+                kind: entitystore.EntityStore(self.game_state[kind]) for kind in INDEXED
+            }
+            return
+
+        for kind, bounds in INDEXED.items():
+            grid = self.index[kind]
+            grid.clear()
+            for entity in self.game_state[kind]:
+                grid.insert(entity, *bounds(entity))
+
+    def index_move(self, kind, entity):
+        """
+        Updates the spatial index or entity store after an object has moved
+        or changed.
+
+        Parameters:
+            kind (str): The game state list the object is in, e.g. "targets".
+            entity (dict): The object that moved.
+        """
+        if self.stores:
+            self.stores[kind].update(entity)
+        else:
+            self.index[kind].move(entity, *INDEXED[kind](entity))
+
+    def index_remove(self, kind, entity):
+        """
+        Removes a destroyed object from its game state list and the spatial
+        index or entity store.
+
+        Parameters:
+            kind (str): The game state list the object is in, e.g. "targets".
+            entity (dict): The object to remove.
+        """
+        self.game_state[kind].remove(entity)
+        if self.stores:
+            self.stores[kind].kill(entity)
+        else:
+            self.index[kind].remove(entity)
+        if id(entity) in self.settling["kinds"]:
+            self.remove_box(entity)
+
+    def first_hit(self, kind, x0, y0, x1, y1):
+        """
+        Finds the first object of a kind that a point moving from (x0, y0) to
+        (x1, y1) hits, by time of impact. Targets are tested as circles and
+        everything else as boxes. Uses the entity stores if the simulation
+        uses NumPy, otherwise the objects near the move in the spatial index.
+
+        Parameters:
+            kind (str): The game state list to test, e.g. "targets".
+            x0 (float): x-coordinate where the move started.
+            y0 (float): y-coordinate where the move started.
+            x1 (float): x-coordinate where the move ended.
+            y1 (float): y-coordinate where the move ended.
+
+        Returns:
+            tuple: The object hit and the time of impact, or (None, None).
+        """
+        if self.stores:
+            if kind == "targets":
+                return self.stores[kind].first_circle_hit(x0, y0, x1, y1)
+            return self.stores[kind].first_box_hit(x0, y0, x1, y1)
+
+        first_hit = None
+        first_time = None
+        for entity in self.index[kind].query_segment(x0, y0, x1, y1):
+            if kind == "targets":
+                entity["radius"] = entity["w"] / 2
+                t = swept_circle_hit(x0, y0, x1, y1, entity["x"], entity["y"], entity["radius"])
+            else:
+                t = swept_box_hit(x0, y0, x1, y1, entity)
+            if t is not None and (first_time is None or t < first_time):
+                first_hit = entity
+                first_time = t
+        return first_hit, first_time
+
+    def clear_entities(self):
+        """
+        Removes all targets, obstacles and planks, e.g. when going back to the
+        menu.
+        """
+        for kind in INDEXED:
+            self.game_state[kind].clear()
+        self.projectiles.clear()
+        self.game_state["boxes"] = []
+        self.track_boxes(self.game_state["boxes"])
+        self.build_index()
+        self.build_support_graph()
+        self.build_plank_stack()
+
+    #---------------------------------Launch ducks---------------------------------------
+    def launch(self):
+        """
+        Initializes the launch process by setting the x and y velocities
+        of the duck based on the current angle and force. Marks the
+        duck as being in flight.
+        """
+        game = self.game
+        angle_rad = game["angle"]
+
+        x_velocity = -game["force"] * math.cos(angle_rad)
+        y_velocity = -game["force"] * math.sin(angle_rad)
+
+        game["x_velocity"] = x_velocity
+        game["y_velocity"] = y_velocity
+
+        game["flight"] = True
+
+    def drag(self, dx, dy):
+        """
+        Moves the duck in the sling by the given amount, keeping it inside
+        the sling's circle. Does nothing while the duck is in flight.
+
+        Parameters:
+            dx (float): Change in x-coordinate of the mouse.
+            dy (float): Change in y-coordinate of the mouse.
+        """
+        game = self.game
+        if not game["flight"]:
+            game["dragging"] = True
+            game["x"] += dx
+            game["y"] += dy
+            game["x"], game["y"] = clamp_inside_circle(
+                game["x"], game["y"], START_X, START_Y, SLING_RADIUS
+            )
+
+    def release(self):
+        """
+        Releases the duck, calculating the launch angle and force from its
+        position in the sling, and launches it. In multi-shot mode the duck
+        is launched as a projectile instead (see launch_projectile).
+        """
+        game = self.game
+        if not game["flight"]:
+            game["angle"] = calculate_angle(START_X, START_Y, game["x"], game["y"])
+            game["force"] = calculate_distance(game["x"], game["y"], START_X, START_Y)
+            if self.multi_shot:
+                self.launch_projectile()
+            else:
+                self.launch()
+        game["dragging"] = False
+
+    def launch_projectile(self):
+        """
+        Launches the duck in the sling as a projectile with the current angle
+        and force, and loads the next duck into the sling at once. This uses
+        up a duck, so nothing is launched when there are none left or when
+        every projectile of the pool is in flight.
+        """
+        game = self.game
+        if self.game_state["remaining_ducks"] <= 0:
+            self.reset_duck()
+            return
+
+        angle_rad = game["angle"]
+        duck = self.projectiles.launch(
+            game["x"], game["y"],
+            -game["force"] * math.cos(angle_rad),
+            -game["force"] * math.sin(angle_rad)
+        )
+        if duck is not None:
+            self.initial_state()
+        else:
+            self.reset_duck()
+
+    def predict_path(self, spacing=PREVIEW_SPACING):
+        """
+        Predicts the flight of the duck if it were released from where it is
+        in the sling. Positions are calculated in closed form (see
+        flight_position), and every tick's move is tested against the
+        collision index, so the path ends where the duck would first hit
+        something or land. The result is kept until the duck or the level
+        changes, so calling this on every frame or drag event is cheap.
+
+        Parameters:
+            spacing (int): Ticks between the returned points.
+
+        Returns:
+            list: (x, y) points along the path, from the sling to where the
+                  flight would end.
+        """
+        game = self.game
+        game_state = self.game_state
+        key = (
+            game["x"], game["y"], spacing, self.generation,
+            len(game_state["targets"]), len(game_state["obstacles"]),
+            len(game_state["breakable_obstacles"])
+        )
+        preview = self.preview
+        if preview["key"] == key:
+            return preview["path"]
+
+        x0, y0 = game["x"], game["y"]
+        x_velocity, y_velocity = launch_velocity(x0, y0)
+        last = min(landing_tick(y0, y_velocity), MAX_PREVIEW_TICKS)
+
+        path = [(x0, y0)]
+        start = (x0, y0)
+        for tick in range(1, last + 1):
+            end = flight_position(x0, y0, x_velocity, y_velocity, tick)
+            first_time = None
+            for kind in INDEXED:
+                _, t = self.first_hit(kind, start[0], start[1], end[0], end[1])
+                if t is not None and (first_time is None or t < first_time):
+                    first_time = t
+            if first_time is not None:
+                path.append((
+                    start[0] + (end[0] - start[0]) * first_time,
+                    start[1] + (end[1] - start[1]) * first_time
+                ))
+                break
+            if tick % spacing == 0 or tick == last:
+                path.append(end)
+            start = end
+
+        preview["key"] = key
+        preview["path"] = path
+        return path
+
+    #---------------------------------Collisions---------------------------------------
+    def initial_state(self):
+        """
+        Puts the game back into its initial state: the duck is put back into the
+        launch position, its speed to zero, and its flight state to False.
+        This uses up one of the remaining ducks; without any left, nothing
+        changes.
+        """
+        if self.game_state["remaining_ducks"] > 0:
+            self.game_state["remaining_ducks"] -= 1
+            self.reset_duck()
+
+    def reset_duck(self):
+        """
+        Puts the duck back into the launch position at rest without using up
+        a duck, e.g. when leaving a level while the last duck is in flight.
+        """
+        game = self.game
+        game["x"] = START_X
+        game["y"] = START_Y
+        game["angle"] = 0
+        game["force"] = 0
+        game["x_velocity"] = 0
+        game["y_velocity"] = 0
+        game["flight"] = False
+        self.previous.pop("duck", None)
+
+    def moving_duck(self, duck=None):
+        """
+        Gives a duck for the collision checks and where its last move
+        started.
+
+        Parameters:
+            duck (Projectile): A projectile, or None for the duck in `game`.
+
+        Returns:
+            tuple: The duck and the (x, y) start of its last move.
+        """
+        if duck is None:
+            return self.game, self.last_position
+        return duck, duck.last_position
+
+    def stop_duck(self, duck=None):
+        """
+        Stops the duck's movement by setting its velocity to zero and ensuring
+        it rests on the ground if below the ground level.
+
+        Parameters:
+            duck (Projectile): A projectile, or None for the duck in `game`.
+        """
+        game = self.game if duck is None else duck
+        game["x_velocity"] = 0
+        game["y_velocity"] = 0
+
+        if game["y"] < GROUND_LEVEL:
+            game["y"] = GROUND_LEVEL
+
+    def rewind_duck(self, t, duck=None):
+        """
+        Moves the duck back along its last move to the point of impact.
+
+        Parameters:
+            t (float): Time of impact as a fraction of the move (0 to 1).
+            duck (Projectile): A projectile, or None for the duck in `game`.
+        """
+        game, (x0, y0) = self.moving_duck(duck)
+        game["x"] = x0 + (game["x"] - x0) * t
+        game["y"] = y0 + (game["y"] - y0) * t
+
+    def target_collision(self, duck=None):
+        """
+        Checks if the duck has collided with any target during its last move. 
+        If a collision is detected, the duck is moved back to the point of 
+        impact, the target is removed, the duck is stopped, and a message is 
+        printed. If it passed through several targets, the first one is hit.
+
+        Parameters:
+            duck (Projectile): A projectile, or None for the duck in `game`.
+        """
+        game, (x0, y0) = self.moving_duck(duck)
+        first_hit, first_time = self.first_hit("targets", x0, y0, game["x"], game["y"])
+
+        if first_hit is not None:
+            self.rewind_duck(first_time, duck)
+            self.index_remove("targets", first_hit)
+            self.removed.append(first_hit)
+            self.log("Hit targets!")
+            self.stop_duck(duck)
+
+    def obstacle_collision(self, duck=None):
+        """
+        Checks if the duck has collided with any obstacle during its last 
+        move. If a collision is detected, the duck is moved back to the point 
+        of impact with the first obstacle it hit, the duck is stopped and a 
+        message is printed.
+
+        Parameters:
+            duck (Projectile): A projectile, or None for the duck in `game`.
+        """
+        game, (x0, y0) = self.moving_duck(duck)
+        _, first_time = self.first_hit("obstacles", x0, y0, game["x"], game["y"])
+
+        if first_time is not None:
+            self.rewind_duck(first_time, duck)
+            self.log("Hit obstacle!")
+            self.stop_duck(duck)
+
+    def check_breakable_collision(self, duck=None):
+        """
+        Checks if the duck has collided with any breakable obstacle during its
+        last move. If a collision is detected, the duck is moved back to the
+        point of impact with the first plank it hit, the plank is marked as
+        falling, the duck is stopped, and a message is printed. The plank's
+        collapse then spreads to the planks it supports (see collapse).
+
+        Parameters:
+            duck (Projectile): A projectile, or None for the duck in `game`.
+        """
+        game, (x0, y0) = self.moving_duck(duck)
+        first_hit, first_time = self.first_hit(
+            "breakable_obstacles", x0, y0, game["x"], game["y"]
+        )
+
+        if first_hit is not None:
+            self.rewind_duck(first_time, duck)
+            self.collapse(first_hit)
+            self.log("Hit obstacle!")
+            self.stop_duck(duck)
+
+    def build_support_graph(self):
+        """
+        Groups the planks of the level for collapse(). A falling plank takes
+        down every plank that rests on it in the same vertical column (same
+        `x`) and every horizontal plank of the same block, so the planks are
+        grouped by column and the horizontal ones by block. Called when a
+        level is loaded.
+        """
+        columns = {}
+        blocks = {}
+        for plank in self.game_state["breakable_obstacles"]:
+            columns.setdefault(plank["x"], []).append(plank)
+            if plank["type"] == "horizontal":
+                blocks.setdefault(plank["block"], []).append(plank)
+        self.support = {
+            "columns": columns,
+            "blocks": blocks
+        }
+
+    def build_plank_stack(self):
+        """
+        Puts the planks and solid obstacles of the level into a new stacking
+        solver. Planks that are falling can move; standing planks and
+        obstacles stay where they are and hold up the planks that land on
+        them. Called when a level is loaded.
+        """
+        stack = stacking.StackSolver(GROUND_LEVEL, GRAVITATIONAL_ACC)
+        planks = self.game_state["breakable_obstacles"]
+        if planks:
+            for box in self.game_state["obstacles"]:
+                stack.add(box, static=True)
+        for plank in planks:
+            stack.add(plank, static=not plank["falling"])
+        self.plank_stack = stack
+
+    def break_plank(self, plank):
+        """
+        Knocks a plank loose: marks it as falling and lets the stacking
+        solver move it. Planks that are already falling are left alone.
+
+        Parameters:
+            plank (dict): The plank.
+        """
+        if plank["falling"]:
+            return
+        plank["falling"] = True
+        self.index_move("breakable_obstacles", plank)
+        self.plank_stack.release(plank)
+
+    def collapse(self, plank):
+        """
+        Marks a plank as falling and spreads the collapse to every plank that
+        depends on it, directly or through other planks, with a breadth-first
+        search over the support graph. Each column and block is visited only
+        once, so the cost is proportional to the number of planks affected.
+
+        Parameters:
+            plank (dict): The plank that was hit.
+        """
+        columns = self.support["columns"]
+        blocks = self.support["blocks"]
+        seen_columns = set()
+        seen_blocks = set()
+        self.break_plank(plank)
+        queue = deque([plank])
+        while queue:
+            current = queue.popleft()
+            groups = []
+            if current["x"] not in seen_columns:
+                seen_columns.add(current["x"])
+                groups.append(columns.get(current["x"], ()))
+            if current["block"] not in seen_blocks:
+                seen_blocks.add(current["block"])
+                groups.append(blocks.get(current["block"], ()))
+
+            for group in groups:
+                for other_plank in group:
+                    if not other_plank["falling"]:
+                        self.break_plank(other_plank)
+                        queue.append(other_plank)
+
+    def falling_obstacle(self, dt=TICK):
+        """
+        Handles the behavior of falling breakable obstacles. The stacking
+        solver moves them until they rest on the ground, an obstacle or
+        other planks. Checks for collisions with targets along each plank's
+        move and removes any hit targets. With NumPy, all planks that moved
+        are tested against all targets at once.
+
+        Parameters:
+            dt (float): Length of the step in seconds.
+        """
+        moves = self.plank_stack.step(dt / TICK)
+        for plank, _ in moves:
+            self.index_move("breakable_obstacles", plank)
+
+        if self.stores:
+            if not moves:
+                return
+            hits = self.stores["targets"].vertical_circle_hits(
+                [plank["x"] for plank, _ in moves],
+                [y0 for _, y0 in moves],
+                [plank["y"] for plank, _ in moves]
+            )
+            for coin in hits:
+                self.index_remove("targets", coin)
+                self.removed.append(coin)
+                self.log("Hit targets!")
+            return
+
+        for plank, y0 in moves:
+            for coin in self.index["targets"].query_segment(plank["x"], y0, plank["x"], plank["y"]):
+                coin["radius"] = coin["w"] / 2
+                if swept_circle_hit(
+                    plank["x"], y0, plank["x"], plank["y"], coin["x"], coin["y"], coin["radius"]
+                ) is not None:
+                    self.index_remove("targets", coin)
+                    self.removed.append(coin)
+                    self.log("Hit targets!")
+
+    #---------------------------------Random Stage---------------------------------------
+    def create_items(self, obs_num, tar_num, min_height, rng=random):
+        """
+        Generates a list of random obstacles and targets and adds them to the
+        game state.
+
+        Parameters:
+            obs_num (int): The number of obstacles to generate.
+            tar_num (int): The number of targets to generate.
+            min_height (int): The minimum y-coordinate for items to spawn.
+            rng (random.Random): The random number generator to use. The
+                default is the global one of the random module.
+
+        Returns:
+            list: A combined list of all generated obstacles and targets.
+        """
+        items = []
+
+        for _ in range(obs_num):
+            each_obs = {
+                "x": rng.randint(340, WIN_WIDTH - 25),
+                "y": rng.randint(min_height, WIN_HEIGHT - 26),
+                "w": 25,
+                "h": 26,
+                "vy": 0
+            }
+            items.append(each_obs)
+            self.game_state["obstacles"].append(each_obs)
+
+        for _ in range(tar_num):
+            each_tar = {
+                "x": rng.randint(340, WIN_WIDTH - 46),
+                "y": rng.randint(min_height, WIN_HEIGHT - 46),
+                "w": 46,
+                "h": 46,
+                "vy": 0
+            }
+            items.append(each_tar)
+            self.game_state["targets"].append(each_tar)
+        return items
+
+    def create_settled_items(self, obs_num, tar_num, seed, density=1.0):
+        """
+        Generates obstacles and targets that don't overlap and are already
+        resting on the ground or on each other (see generator.settled_items),
+        and adds them to the game state.
+
+        Parameters:
+            obs_num (int): The number of obstacles to generate.
+            tar_num (int): The number of targets to generate.
+            seed (int): Seed for the layout.
+            density (float): How much of the area's width is used for stacks,
+                between 0 (exclusive) and 1.
+
+        Returns:
+            list: A combined list of all generated obstacles and targets.
+
+        Raises:
+            ValueError: If the items don't fit in the window at the given
+                density.
+        """
+        obstacles, targets = generator.settled_items(
+            seed, obs_num, tar_num, density, 340, WIN_WIDTH, GROUND_LEVEL, WIN_HEIGHT
+        )
+        self.game_state["obstacles"].extend(obstacles)
+        self.game_state["targets"].extend(targets)
+        return obstacles + targets
+
+    def track_boxes(self, items):
+        """
+        Puts the boxes of a random round into a new stacking solver. All
+        boxes start awake; the solver puts them to sleep as they come to
+        rest. Boxes that are generated inside each other are put on top of
+        each other.
+
+        self.settling holds:
+            items: The list of boxes being tracked.
+            kinds: The game state list ("obstacles" or "targets") of each box,
+                keyed by its id.
+            stack: The stacking.StackSolver that moves the boxes.
+
+        Parameters:
+            items (list): The boxes of the random round.
+        """
+        settling = self.settling
+        settling["items"] = items
+        settling["kinds"] = {
+            id(box): kind for kind in ("obstacles", "targets") for box in self.game_state[kind]
+        }
+        stack = stacking.StackSolver(GROUND_LEVEL, GRAVITATIONAL_ACC, separate=True)
+        for box in items:
+            stack.add(box)
+        settling["stack"] = stack
+
+    def remove_box(self, box):
+        """
+        Stops tracking a destroyed box and wakes up the boxes resting on it.
+
+        Parameters:
+            box (dict): The destroyed box.
+        """
+        settling = self.settling
+        items = settling["items"]
+        for i, other in enumerate(items):
+            if other is box:
+                del items[i]
+                break
+        del settling["kinds"][id(box)]
+        settling["stack"].remove(box)
+
+    def drop(self, items, dt=TICK):
+        """
+        Simulates the dropping of items under gravity, ensuring items rest on
+        the ground or on top of each other (see stacking.StackSolver).
+
+        Items that have come to rest are put to sleep and skipped until
+        something under them is removed (see remove_box), so a settled round
+        costs next to nothing per tick.
+
+        Parameters:
+            items (list): A list of items to be updated based on gravitational force.
+            dt (float): Length of the step in seconds.
+
+        Returns:
+            list: The items that moved.
+        """
+        settling = self.settling
+        if settling["items"] is not items:
+            self.track_boxes(items)
+        return [block for block, _ in settling["stack"].step(dt / TICK)]
+
+    def start_random_run(self):
+        """
+        Starts a new run of random rounds from the first round. The run gets
+        the seed given to the simulation, or a new one if there isn't any.
+        """
+        game_state = self.game_state
+        game_state["seed"] = self.seed if self.seed is not None else random.getrandbits(32)
+        game_state["is_random"] = True
+        game_state["round"] = 1
+        self.create_new_round()
+
+    def prepare_round(self, round_number):
+        """
+        Starts building a round of the current run in the worker thread, so
+        that create_new_round() only has to swap it in.
+
+        Parameters:
+            round_number (int): The round to build.
+        """
+        key = (self.game_state["seed"], round_number)
+        if self.pending is not None and self.pending[0] == key:
+            return
+
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = (key, self.executor.submit(build_round, *key, self.settled_rounds))
+
+    def create_new_round(self):
+        """
+        Sets up a new round in the game. Clears previous targets and obstacles,
+        puts in the round for the current seed and round number, resets the
+        duck count, and updates the game state to indicate a random level.
+
+        The round is taken from the background worker if it has built it,
+        otherwise it's built now. The same seed and round always give the
+        same level, so restarting a round plays the same layout again.
+        """
+        game_state = self.game_state
+        if game_state["seed"] is None:
+            game_state["seed"] = self.seed if self.seed is not None else random.getrandbits(32)
+
+        key = (game_state["seed"], game_state["round"])
+        if self.pending is not None and self.pending[0] == key:
+            obstacles, targets = self.pending[1].result()
+            self.pending = None
+        else:
+            obstacles, targets = build_round(*key, self.settled_rounds)
+
+        game_state["targets"].clear()
+        game_state["obstacles"].clear()
+        game_state["breakable_obstacles"].clear()
+        game_state["obstacles"].extend(obstacles)
+        game_state["targets"].extend(targets)
+        game_state["remaining_ducks"] = MAX_DUCKS
+        game_state["boxes"] = obstacles + targets
+        self.projectiles.clear()
+        self.track_boxes(game_state["boxes"])
+        self.build_index()
+        self.build_support_graph()
+        self.build_plank_stack()
+        self.previous.clear()
+        self.generation += 1
+
+        if self.background and game_state["round"] < TOTAL_ROUNDS:
+            self.prepare_round(game_state["round"] + 1)
+
+    #---------------------------------Levels---------------------------------------------
+    def load_level(self, level):
+        """
+        Loads a new level or state based on the provided level identifier.
+
+        This function:
+        - Loads a normal level from the level cache, which reads the file only
+          the first time, and updates the game state (obstacles, targets,
+          duck count, etc.) with a fresh copy of it. The level's
+          `obstacle_type` decides whether its obstacles are solid or
+          breakable planks.
+        - Handles transitions to win or lose states for both normal and random levels.
+        - Resets game elements (like ducks, obstacles, and targets) before loading
+          a new level or state.
+        - In case of a win, it updates the game state with the next level to load.
+
+        It handles three types of levels:
+        - Normal levels, as JSON files (e.g., "level1.json") or binary level
+          files (e.g., "level1.lvl", see levelfile).
+        - Random levels (e.g., "random").
+        - Special states for win/lose conditions.
+
+        Parameters:
+            level (str): A string representing the level to load. This can be a normal level
+                        file (e.g., "level1.json"), a random level ("random"), or a special
+                        game state ("win", "lose").
+        """
+        game_state = self.game_state
+        game_state["used_ducks"].clear()
+        self.projectiles.clear()
+        game_state["obstacles"].clear()
+        game_state["targets"].clear()
+        game_state["breakable_obstacles"].clear()
+
+        try:
+            if level == "win":
+                game_state["level"] = level
+                game_state["next_level"] = None
+
+            # Normal levels
+            elif level.endswith(".json") or level.endswith(levelfile.EXTENSION):
+                    try:
+                        data = self.levels.load(level)
+                        game_state["level"] = level
+                        kind = OBSTACLE_KINDS[data.get("obstacle_type", "solid")]
+                        game_state[kind] = data["obstacles"]
+                        game_state["targets"] = data["targets"]
+                        game_state["remaining_ducks"] = data["ducks"]
+                        game_state["next_level"] = data["next_level"]
+                        self.build_index()
+                        self.build_support_graph()
+                        self.build_plank_stack()
+                        self.previous.clear()
+                        self.generation += 1
+                    except (IOError, ValueError, KeyError):
+                        print("Failed to load level.")
+        except AttributeError:
+            print("There are no more levels left!") #Catch errors for pressing C option
+
+    #---------------------------------Stepping-------------------------------------------
+    def advance(self, elapsed, on_tick=None):
+        """
+        Advances the game by the given amount of real time using fixed ticks.
+        The elapsed time is added to an accumulator and one tick is run for
+        every full TICK in it, so the game plays the same no matter how often
+        this is called. The leftover time is kept for the next call and used
+        by interpolate(). At most MAX_CATCH_UP_STEPS ticks are run per call;
+        if the game falls further behind than that, the extra time is dropped.
+
+        Parameters:
+            elapsed (float): Real time elapsed since the last call in seconds.
+            on_tick (function): Called with the number of ticks run so far
+                before each tick, e.g. to feed recorded input back in.
+
+        Returns:
+            int: The number of ticks that were run.
+        """
+        self.accumulator += elapsed
+        steps = 0
+        while self.accumulator >= TICK:
+            if steps == MAX_CATCH_UP_STEPS:
+                self.accumulator %= TICK
+                break
+            if on_tick is not None:
+                on_tick(self.ticks)
+            self.remember_positions()
+            self.step(TICK)
+            self.accumulator -= TICK
+            steps += 1
+        return steps
+
+    def remember_positions(self):
+        """
+        Saves the positions of the objects that can move (the duck in flight,
+        projectiles, falling planks and the boxes of random levels) before a
+        tick, so that interpolate() can blend between them and the positions
+        after it.
+        """
+        previous = self.previous
+        previous.clear()
+        game = self.game
+        if game["flight"]:
+            previous["duck"] = (game["x"], game["y"])
+        for duck in self.projectiles.active:
+            previous[id(duck)] = (duck.x, duck.y)
+
+        for plank in self.plank_stack.awake.values():
+            previous[id(plank)] = (plank["x"], plank["y"])
+
+        if self.game_state["level"] == "random":
+            if self.settling["items"] is not self.game_state["boxes"]:
+                self.track_boxes(self.game_state["boxes"])
+            for box in self.settling["stack"].awake.values():
+                previous[id(box)] = (box["x"], box["y"])
+
+    def interpolate(self, key, entity):
+        """
+        Returns the position an object should be drawn at, blended between
+        its positions before and after the last tick by how far the
+        accumulator is into the next tick. Drawing interpolated positions
+        keeps movement smooth when frames and ticks don't line up. Objects
+        that didn't move in the last tick are drawn where they are.
+
+        Parameters:
+            key (object): "duck" for the duck, otherwise the id of the object.
+            entity (dict): The object, with properties `x` and `y`.
+
+        Returns:
+            tuple: The (x, y) position to draw the object at.
+        """
+        previous = self.previous.get(key)
+        if previous is None:
+            return entity["x"], entity["y"]
+
+        alpha = self.accumulator / TICK
+        return (
+            previous[0] + (entity["x"] - previous[0]) * alpha,
+            previous[1] + (entity["y"] - previous[1]) * alpha
+        )
+
+    def check_outcome(self, out_of_ducks):
+        """
+        Ends the level if it has been won or lost. The level is won when all
+        targets are destroyed; in random rounds this moves on to the next
+        round, and after the last one the run is won. Otherwise the level is
+        lost if the player is out of ducks. The outcome is only decided once:
+        the simulation keeps running behind the win and lose screens and
+        this is called again on later ticks, when e.g. a falling plank may
+        still destroy a target, but a result that has already been shown
+        is not evaluated again.
+
+        Parameters:
+            out_of_ducks (bool): Whether the player has no ducks left.
+        """
+        game_state = self.game_state
+        if game_state["level"] in ("win", "lose"):
+            return
+        if not game_state["targets"] and game_state["remaining_ducks"] >= 0:
+            if not game_state["is_random"]:
+                game_state["level"] = "win"
+            else:
+                if game_state["round"] < TOTAL_ROUNDS:
+                    game_state["round"] += 1
+                    self.create_new_round()
+                else:
+                    game_state["next_level"] = None
+                    game_state["level"] = "win"
+        elif out_of_ducks:
+            game_state["level"] = "lose"
+
+    def fly_projectiles(self, ticks):
+        """
+        Moves the ducks in flight in multi-shot mode, checks each of them for
+        collisions like the duck in `game` and gives the ones that have
+        landed back to the pool, listing them in `removed`. The level is
+        lost once there are no ducks left in the sling or in the air.
+
+        Parameters:
+            ticks (float): Length of the step in ticks.
+        """
+        game_state = self.game_state
+        landed = []
+        for duck in self.projectiles.active:
+            duck.last_position = (duck.x, duck.y)
+            duck.y_velocity -= GRAVITATIONAL_ACC * ticks
+            duck.x += duck.x_velocity * ticks
+            duck.y += duck.y_velocity * ticks
+
+            self.obstacle_collision(duck)
+            self.target_collision(duck)
+            self.check_breakable_collision(duck)
+            if duck.y <= GROUND_LEVEL:
+                landed.append(duck)
+            if not game_state["targets"]:
+                break
+
+        for duck in landed:
+            game_state["used_ducks"].append((duck.x, duck.y))
+            self.projectiles.retire(duck)
+            self.removed.append(duck)
+        out_of_ducks = game_state["remaining_ducks"] == 0 and not self.projectiles.active
+        self.check_outcome(out_of_ducks)
+
+    def step(self, dt=TICK):
+        """
+        Advances the game by one step, handling physics, collisions, and
+        transitions between game states.
+
+        This function executes the following logic:
+        - Updates the position of objects affected by gravity, such as blocks falling
+          in the "random" level.
+        - Handles the flight mechanics of the duck, updating its position based on
+          velocity and applying gravitational acceleration.
+        - Checks for collisions:
+            - Ducks with obstacles in level 1.
+            - Ducks with breakable obstacles in level 2.
+            - Ducks with targets across all levels.
+        - Manages the win condition:
+            - If all targets are cleared and ducks remain, the player wins, and
+              the win message appears prompting users to choose next actions.
+            - If playing random levels, transitions to the next random level or
+              ends the game if all rounds are completed.
+        - Manages the lose condition:
+            - If no ducks remain and targets are not cleared, the player loses and
+              the lose message appears prompting users to choose next actions.
+        - Handles the physics for falling objects, including interactions where
+          falling obstacles can destroy targets in level 2.
+
+        Frontends should normally call advance() instead, which runs this
+        with fixed ticks.
+
+        Parameters:
+            dt (float): Length of the step in seconds. The default is one tick
+                (1/60 s), which is what the game has always been tuned for.
+        """
+        game = self.game
+        game_state = self.game_state
+        ticks = dt / TICK
+        self.ticks += 1
+
+        if game_state["level"] == "random":
+            kinds = self.settling["kinds"]
+            for box in self.drop(game_state["boxes"], dt):
+                self.index_move(kinds[id(box)], box)
+
+        if game["flight"]:
+            self.last_position = (game["x"], game["y"])
+            game["y_velocity"] -= GRAVITATIONAL_ACC * ticks
+            game["x"] += game["x_velocity"] * ticks
+            game["y"] += game["y_velocity"] * ticks
+
+            #Collision for level 1
+            self.obstacle_collision()
+            self.target_collision()
+            self.check_outcome(game_state["remaining_ducks"] == 0)
+
+            #Collision for level 2
+            self.check_breakable_collision()
+
+            if game["y"] <= GROUND_LEVEL:
+                game_state["used_ducks"].append((game["x"], game["y"]))
+                self.initial_state()
+
+        if self.projectiles.active:
+            self.fly_projectiles(ticks)
+
+        #Falling obstacles destroy targets level 2
+        self.falling_obstacle(dt)
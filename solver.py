@@ -0,0 +1,350 @@
+"""
+Headless shot solver for A Wee Bit Miffed Ducks, for checking levels.
+
+Sweeps every launch the sling allows: the duck can be released anywhere
+inside the SLING_RADIUS circle around (START_X, START_Y), which gives every
+angle and forces from 0 to SLING_RADIUS. Each shot is played in a
+simulation.Simulation, so the results follow the game's rules exactly,
+including planks that fall onto targets. The shots are split into shards by
+angle and run in a process pool.
+
+With NumPy, the flights of a whole shard are first calculated at once in
+closed form (see simulation.flight_position) and tested against the
+bounding boxes of the level's objects. Shots that don't come near anything
+land without hitting a target, so only the rest need to be simulated.
+
+The solver also searches for the fewest ducks needed to clear the level:
+it tries every shot from the start, then every shot again from each new set
+of remaining targets, and so on. Only the first shots found to reach a set
+of remaining targets are followed, although other shots may leave the
+planks in a better place for the next duck, so the number of ducks found is
+an upper bound: the level can be cleared with that many, but maybe with
+fewer. A level that needs a single duck is always found.
+
+Example:
+
+    python solver.py level2.json --angles 180 --forces 35 --workers 4
+"""
+
+import os
+import sys
+import math
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import simulation
+import levels
+from simulation import START_X, START_Y, SLING_RADIUS, GROUND_LEVEL, GRAVITATIONAL_ACC
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Most ticks a shot is simulated for, including planks falling after the
+# duck has landed
+MAX_SHOT_TICKS = 900
+
+# Level cache of the worker process
+CACHE = levels.LevelCache()
+
+def launch_space(angles, forces):
+    """
+    Lists the shots to try: evenly spaced angles all the way around the
+    sling and evenly spaced forces up to SLING_RADIUS.
+
+    Parameters:
+        angles (int): The number of angles.
+        forces (int): The number of forces.
+
+    Returns:
+        list: The shots as (angle, force) pairs, angle in radians.
+    """
+    return [
+        (2 * math.pi * i / angles - math.pi, SLING_RADIUS * (j + 1) / forces)
+        for i in range(angles)
+        for j in range(forces)
+    ]
+
+def sling_position(shot):
+    """
+    Gives where the duck has to be released in the sling for a shot.
+
+    Parameters:
+        shot (tuple): The shot as (angle, force).
+
+    Returns:
+        tuple: The (x, y) release position.
+    """
+    angle, force = shot
+    return START_X + force * math.cos(angle), START_Y + force * math.sin(angle)
+
+def start_level(path, shots):
+    """
+    Loads a level and plays a list of shots in it. The simulation gets a
+    duck for each of the shots and one more for the shot to try after them,
+    whatever the level allows: the solver counts ducks itself, and the
+    level mustn't be lost while a shot is being played.
+
+    Parameters:
+        path (str): Path of the level file.
+        shots (list): The shots to play first, as (angle, force) pairs.
+
+    Returns:
+        Simulation: The simulation after the shots.
+    """
+    sim = simulation.Simulation(verbose=False, level_cache=CACHE)
+    sim.load_level(path)
+    sim.game_state["remaining_ducks"] = len(shots) + 1
+    for i, target in enumerate(sim.game_state["targets"]):
+        target["solver_id"] = i
+    for shot in shots:
+        play_shot(sim, shot)
+    return sim
+
+def play_shot(sim, shot):
+    """
+    Releases the duck for a shot and runs the simulation until the duck has
+    landed and no falling plank can hit a target anymore, because it has
+    come to rest or is below every target.
+
+    Parameters:
+        sim (Simulation): The simulation to play the shot in.
+        shot (tuple): The shot as (angle, force).
+    """
+    x, y = sling_position(shot)
+    sim.drag(x - sim.game["x"], y - sim.game["y"])
+    sim.release()
+    game_state = sim.game_state
+    for _ in range(MAX_SHOT_TICKS):
+        sim.step()
+        if sim.game["flight"]:
+            continue
+        if not game_state["targets"]:
+            break
+        lowest = min(target["y"] - target["w"] / 2 for target in game_state["targets"])
+        if all(
+            plank["y"] + plank["h"] < lowest for plank in sim.plank_stack.awake.values()
+        ):
+            break
+
+def remaining_targets(sim):
+    """
+    Gives the targets that are left in a simulation.
+
+    Parameters:
+        sim (Simulation): The simulation.
+
+    Returns:
+        frozenset: The numbers of the remaining targets, in the order of the
+                   level file.
+    """
+    return frozenset(target["solver_id"] for target in sim.game_state["targets"])
+
+def near_misses(sim, shots):
+    """
+    Finds the shots whose flights don't come near any object, calculating
+    all flights at once with NumPy. Each flight is followed until it lands
+    and every move is tested against the bounding boxes of the obstacles,
+    planks and targets. The test is conservative: a shot that isn't found
+    here can still miss, but a shot that is found certainly doesn't hit
+    anything.
+
+    Parameters:
+        sim (Simulation): The simulation with the level as it is before the
+            shots.
+        shots (list): The shots as (angle, force) pairs.
+
+    Returns:
+        list: For every shot, True if it can't hit anything.
+    """
+    if numpy is None or not shots:
+        return [False] * len(shots)
+
+    angle = numpy.array([shot[0] for shot in shots])
+    force = numpy.array([shot[1] for shot in shots])
+    x0 = START_X + force * numpy.cos(angle)
+    y0 = START_Y + force * numpy.sin(angle)
+    x_velocity = -force * numpy.cos(angle)
+    y_velocity = -force * numpy.sin(angle)
+
+    # Landing tick of every shot, see simulation.landing_tick
+    a = GRAVITATIONAL_ACC / 2
+    b = a - y_velocity
+    c = GROUND_LEVEL - y0
+    root = numpy.sqrt(numpy.maximum(b * b - 4 * a * c, 0))
+    lands_at_once = y0 + y_velocity - GRAVITATIONAL_ACC <= GROUND_LEVEL
+    landing = numpy.where(lands_at_once, 1, numpy.ceil((-b + root) / (2 * a)) + 1)
+    landing = numpy.clip(landing, 1, simulation.MAX_PREVIEW_TICKS)
+
+    ticks = numpy.arange(int(landing.max()) + 1)
+    x = x0[:, None] + x_velocity[:, None] * ticks
+    y = y0[:, None] + y_velocity[:, None] * ticks - GRAVITATIONAL_ACC * ticks * (ticks + 1) / 2
+    in_flight = ticks[1:] <= landing[:, None]
+    left = numpy.minimum(x[:, :-1], x[:, 1:])
+    right = numpy.maximum(x[:, :-1], x[:, 1:])
+    bottom = numpy.minimum(y[:, :-1], y[:, 1:])
+    top = numpy.maximum(y[:, :-1], y[:, 1:])
+
+    near = numpy.zeros(len(shots), dtype=bool)
+    for kind, bounds in simulation.INDEXED.items():
+        for entity in sim.game_state[kind]:
+            box_left, box_bottom, width, height = bounds(entity)
+            near |= (
+                in_flight
+                & (left <= box_left + width) & (right >= box_left)
+                & (bottom <= box_bottom + height) & (top >= box_bottom)
+            ).any(axis=1)
+    return (~near).tolist()
+
+def sweep_shard(path, prefix, shots):
+    """
+    Plays every shot of a shard after the same opening shots and records
+    which targets each of them destroys. Run in a worker process.
+
+    Parameters:
+        path (str): Path of the level file.
+        prefix (list): The shots played before each shot.
+        shots (list): The shots of the shard.
+
+    Returns:
+        list: For every shot that destroyed targets, the shot and the
+              remaining targets after it.
+    """
+    start = start_level(path, prefix)
+    before = remaining_targets(start)
+    results = []
+    for shot, miss in zip(shots, near_misses(start, shots)):
+        if miss:
+            continue
+        sim = start_level(path, prefix)
+        play_shot(sim, shot)
+        after = remaining_targets(sim)
+        if after != before:
+            results.append((shot, after))
+    return results
+
+def sweep(executor, path, prefix, shots, shards):
+    """
+    Plays every shot after the opening shots, split into shards that are
+    run in parallel.
+
+    Parameters:
+        executor (Executor): The process pool.
+        path (str): Path of the level file.
+        prefix (list): The shots played before each shot.
+        shots (list): The shots to try.
+        shards (int): The number of shards.
+
+    Returns:
+        list: The shots that destroyed targets, with the remaining targets
+              after each.
+    """
+    size = math.ceil(len(shots) / shards)
+    futures = [
+        executor.submit(sweep_shard, path, prefix, shots[i:i + size])
+        for i in range(0, len(shots), size)
+    ]
+    results = []
+    for future in futures:
+        results.extend(future.result())
+    return results
+
+def solve(path, angles=180, forces=35, workers=None):
+    """
+    Sweeps the launch space of a level and searches for the fewest ducks
+    that clear it.
+
+    Parameters:
+        path (str): Path of the level file.
+        angles (int): The number of angles to try.
+        forces (int): The number of forces to try.
+        workers (int): The number of worker processes. The default is the
+            number of CPUs.
+
+    Returns:
+        dict: "shots", the number of shots tried from the start; "hits",
+              for every target (by its number in the level file) the shots
+              that destroy it from the start; "ducks" and "solution", the
+              fewest ducks the search found to clear the level and the shots
+              to do it, or None if it found no way within the level's ducks.
+              The search follows only one way of reaching each set of
+              remaining targets, so "ducks" is an upper bound (see the
+              module docstring).
+    """
+    path = os.path.abspath(path)
+    shots = launch_space(angles, forces)
+    workers = workers or os.cpu_count() or 1
+    start = start_level(path, [])
+    everything = remaining_targets(start)
+    max_ducks = CACHE.snapshot(path)["ducks"]
+
+    report = {
+        "level": path,
+        "shots": len(shots),
+        "hits": {number: [] for number in sorted(everything)},
+        "ducks": None,
+        "solution": None
+    }
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        frontier = {everything: []}
+        seen = {everything}
+        for ducks in range(1, max_ducks + 1):
+            following = {}
+            for remaining, prefix in frontier.items():
+                for shot, after in sweep(executor, path, prefix, shots, workers * 4):
+                    if not prefix:
+                        for number in sorted(everything - after):
+                            report["hits"][number].append(shot)
+                    if not after and report["solution"] is None:
+                        report["ducks"] = ducks
+                        report["solution"] = prefix + [shot]
+                    if after not in seen:
+                        seen.add(after)
+                        following[after] = prefix + [shot]
+            if report["solution"] is not None or not following:
+                break
+            frontier = following
+    return report
+
+def print_report(report):
+    """
+    Prints a solver report in a readable form.
+
+    Parameters:
+        report (dict): The report, as returned by solve.
+    """
+    print("Level: {}".format(report["level"]))
+    print("Shots tried: {}".format(report["shots"]))
+    for number, hits in report["hits"].items():
+        print("Target {}: hit by {} shots".format(number, len(hits)))
+    if report["solution"] is None:
+        print("No way to clear the level with its ducks was found.")
+        return
+
+    if report["ducks"] == 1:
+        print("Fewest ducks needed: 1")
+    else:
+        print("Ducks needed: at most {} (an upper bound, see solver.py)".format(report["ducks"]))
+    for angle, force in report["solution"]:
+        x, y = sling_position((angle, force))
+        print("  release at ({:.1f}, {:.1f}): angle {:.1f} deg, force {:.1f}".format(
+            x, y, math.degrees(angle), force
+        ))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Finds the shots that clear a level.")
+    parser.add_argument("level", help="level file (.json or .lvl)")
+    parser.add_argument("--angles", type=int, default=180, help="number of angles to try")
+    parser.add_argument("--forces", type=int, default=35, help="number of forces to try")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    result = solve(args.level, args.angles, args.forces, args.workers)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(result, file, indent=4)
+    sys.exit(0 if result["solution"] is not None else 1)
@@ -0,0 +1,200 @@
+"""
+Uniform grid index for the collision queries of A Wee Bit Miffed Ducks.
+
+The play field is divided into square cells and every object is stored in
+the cells its bounding box overlaps. A collision check then only needs to
+look at the objects in the cells around the moving object instead of every
+object in the level. Cells are kept in a dictionary, so objects that leave
+the window (e.g. planks falling below the ground) still work.
+"""
+
+import math
+
+CELL_SIZE = 32
+
+class SpatialGrid:
+    """
+    Stores objects (dictionaries) by the grid cells their bounding boxes
+    overlap. Objects are identified by their id, so the same dictionaries
+    that are kept in the game state can be stored as they are.
+
+    Attributes:
+        cell_size (float): Width and height of one cell in pixels.
+        cells (dict): Lists of objects, keyed by (column, row).
+        entries (dict): The cell range, insertion number and the object
+            itself for every stored object, keyed by the object's id.
+        counter (int): Insertion number given to the next object.
+    """
+
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.entries = {}
+        self.counter = 0
+
+    def __len__(self):
+        """
+        Returns the number of objects in the grid.
+        """
+        return len(self.entries)
+
+    def cell_range(self, left, bottom, width, height):
+        """
+        Calculates which cells a box overlaps.
+
+        Parameters:
+            left (float): x-coordinate of the box's left edge.
+            bottom (float): y-coordinate of the box's bottom edge.
+            width (float): Width of the box.
+            height (float): Height of the box.
+
+        Returns:
+            tuple: The first and last column and row as
+                   (first_column, first_row, last_column, last_row).
+        """
+        size = self.cell_size
+        return (
+            math.floor(left / size),
+            math.floor(bottom / size),
+            math.floor((left + width) / size),
+            math.floor((bottom + height) / size)
+        )
+
+    def insert(self, entity, left, bottom, width, height):
+        """
+        Adds an object to the grid with the given bounding box.
+
+        Parameters:
+            entity (dict): The object to store.
+            left (float): x-coordinate of the bounding box's left edge.
+            bottom (float): y-coordinate of the bounding box's bottom edge.
+            width (float): Width of the bounding box.
+            height (float): Height of the bounding box.
+        """
+        span = self.cell_range(left, bottom, width, height)
+        self.entries[id(entity)] = [span, self.counter, entity]
+        self.counter += 1
+        self.add_to_cells(entity, span)
+
+    def remove(self, entity):
+        """
+        Removes an object from the grid. Removing an object that isn't in the
+        grid does nothing.
+
+        Parameters:
+            entity (dict): The object to remove.
+        """
+        entry = self.entries.pop(id(entity), None)
+        if entry is not None:
+            self.remove_from_cells(entity, entry[0])
+
+    def move(self, entity, left, bottom, width, height):
+        """
+        Updates an object's bounding box after it has moved. The cells are
+        only touched if the object moved to a different cell.
+
+        Parameters:
+            entity (dict): The object that moved.
+            left (float): x-coordinate of the bounding box's left edge.
+            bottom (float): y-coordinate of the bounding box's bottom edge.
+            width (float): Width of the bounding box.
+            height (float): Height of the bounding box.
+        """
+        entry = self.entries.get(id(entity))
+        if entry is None:
+            self.insert(entity, left, bottom, width, height)
+            return
+
+        span = self.cell_range(left, bottom, width, height)
+        if span != entry[0]:
+            self.remove_from_cells(entity, entry[0])
+            self.add_to_cells(entity, span)
+            entry[0] = span
+
+    def clear(self):
+        """
+        Removes all objects from the grid.
+        """
+        self.cells.clear()
+        self.entries.clear()
+
+    def add_to_cells(self, entity, span):
+        """
+        Adds an object to every cell in a cell range.
+
+        Parameters:
+            entity (dict): The object to add.
+            span (tuple): Cell range, as returned by cell_range.
+        """
+        first_column, first_row, last_column, last_row = span
+        for column in range(first_column, last_column + 1):
+            for row in range(first_row, last_row + 1):
+                self.cells.setdefault((column, row), []).append(entity)
+
+    def remove_from_cells(self, entity, span):
+        """
+        Removes an object from every cell in a cell range. Cells that become
+        empty are deleted.
+
+        Parameters:
+            entity (dict): The object to remove.
+            span (tuple): Cell range, as returned by cell_range.
+        """
+        first_column, first_row, last_column, last_row = span
+        for column in range(first_column, last_column + 1):
+            for row in range(first_row, last_row + 1):
+                cell = self.cells[(column, row)]
+                for i, other in enumerate(cell):
+                    if other is entity:
+                        del cell[i]
+                        break
+                if not cell:
+                    del self.cells[(column, row)]
+
+    def query_box(self, left, bottom, width, height):
+        """
+        Finds the objects whose cells overlap a box. The result can contain
+        objects that don't actually overlap the box, so the exact collision
+        test still needs to be done for each of them. Objects are returned in
+        the order they were inserted, so results don't depend on memory
+        addresses.
+
+        Parameters:
+            left (float): x-coordinate of the box's left edge.
+            bottom (float): y-coordinate of the box's bottom edge.
+            width (float): Width of the box.
+            height (float): Height of the box.
+
+        Returns:
+            list: The objects found.
+        """
+        first_column, first_row, last_column, last_row = self.cell_range(
+            left, bottom, width, height
+        )
+        found = {}
+        cells = self.cells
+        for column in range(first_column, last_column + 1):
+            for row in range(first_row, last_row + 1):
+                for entity in cells.get((column, row), ()):
+                    found[id(entity)] = entity
+
+        if len(found) < 2:
+            return list(found.values())
+        entries = self.entries
+        return sorted(found.values(), key=lambda entity: entries[id(entity)][1])
+
+    def query_segment(self, x0, y0, x1, y1):
+        """
+        Finds the objects whose cells overlap the bounding box of a line
+        segment, e.g. an object's move during one tick.
+
+        Parameters:
+            x0 (float): x-coordinate of the segment's start.
+            y0 (float): y-coordinate of the segment's start.
+            x1 (float): x-coordinate of the segment's end.
+            y1 (float): y-coordinate of the segment's end.
+
+        Returns:
+            list: The objects found.
+        """
+        return self.query_box(min(x0, x1), min(y0, y1), abs(x1 - x0), abs(y1 - y0))
@@ -0,0 +1,345 @@
+"""
+Rigid-body stacking for the falling planks and random boxes of A Wee Bit
+Miffed Ducks.
+
+Objects are axis-aligned boxes (dictionaries with `x`, `y`, `w`, `h` and a
+vertical velocity `vy`, positive upwards) that only move up and down, like
+they always have in the game. Every step the solver:
+
+1. applies gravity to the boxes that are awake,
+2. finds the pairs of boxes that can touch during the step with a
+   spatial.SpatialGrid (broad phase) and turns the ones that lie on top of
+   each other into contacts, along with contacts with the ground (narrow
+   phase),
+3. solves the contacts with sequential impulses, starting from the
+   impulses the same contacts had in the last step (warm starting), so that
+   a stack that is already resting stays put from the first iteration,
+4. moves the boxes, pushes boxes that have sunk into the box under them
+   back on top and clamps everything to the ground.
+
+Contacts are speculative: a box falling towards another one may close the
+gap between them during a step but not go further, so fast boxes land
+exactly on top instead of passing through. Boxes that come to rest on the
+ground, on a static box or on a sleeping box are put to sleep and cost
+nothing until the box under them is removed or starts moving (see wake).
+"""
+
+from collections import deque
+import spatial
+
+# Velocity iterations per step
+ITERATIONS = 8
+
+# Distance in pixels that counts as touching. Planks whose sides overlap by
+# no more than this also stand next to each other instead of on top of each
+# other, since the planks of the level files overlap their neighbours by a
+# few pixels. Boxes that the solver separates have no such tolerance.
+SLOP = 4
+
+# Speed in pixels per tick under which a box that is held up falls asleep
+SLEEP_SPEED = 0.05
+
+def overlap(low_a, size_a, low_b, size_b):
+    """
+    Calculates how much two ranges on the same axis overlap.
+
+    Parameters:
+        low_a (float): Start of the first range.
+        size_a (float): Length of the first range.
+        low_b (float): Start of the second range.
+        size_b (float): Length of the second range.
+
+    Returns:
+        float: The length of the overlap, negative if the ranges are apart.
+    """
+    return min(low_a + size_a, low_b + size_b) - max(low_a, low_b)
+
+def bounds(body):
+    """
+    Returns the bounding box of a box.
+
+    Parameters:
+        body (dict): A box with properties `x`, `y`, `w` and `h`.
+
+    Returns:
+        tuple: The box as (left, bottom, width, height).
+    """
+    return body["x"], body["y"], body["w"], body["h"]
+
+class StackSolver:
+    """
+    Moves boxes under gravity and keeps them resting on the ground and on
+    each other. Boxes can be static, in which case they hold up other boxes
+    but never move themselves. The boxes are the same dictionaries that are
+    kept in the game state; the solver writes `y` and `vy` into them.
+
+    Attributes:
+        ground (float): y-coordinate of the ground.
+        gravity (float): Gravitational acceleration in pixels per tick
+            squared.
+        iterations (int): Velocity iterations per step.
+        separate (bool): Whether boxes that have sunk into each other deeper
+            than their sides overlap are put on top of each other anyway.
+            Otherwise they are side by side and pass each other, which keeps
+            the overlapping planks of the level files where they are.
+        side_slop (float): How much the sides of two boxes may overlap
+            without a contact: SLOP, or 0 for boxes that are separated, so
+            that any two of them that overlap at all land on each other.
+        grid (SpatialGrid): Every box, static or not, for finding the pairs
+            that can touch.
+        inverse_mass (dict): 1 / mass of every box that can move, keyed by
+            its id. A box weighs as much as its area.
+        awake (dict): The boxes that are moving, keyed by their id.
+        impulses (dict): The impulse of every contact in the last step,
+            keyed by the ids of the lower box (the id of None for the
+            ground) and the upper box.
+    """
+
+    def __init__(self, ground, gravity, iterations=ITERATIONS, separate=False):
+        self.ground = ground
+        self.gravity = gravity
+        self.iterations = iterations
+        self.separate = separate
+        self.side_slop = 0 if separate else SLOP
+        self.grid = spatial.SpatialGrid()
+        self.inverse_mass = {}
+        self.awake = {}
+        self.impulses = {}
+
+    def add(self, body, static=False):
+        """
+        Adds a box. Boxes that can move start awake.
+
+        Parameters:
+            body (dict): The box.
+            static (bool): Whether the box stays where it is.
+        """
+        self.grid.insert(body, *bounds(body))
+        if not static:
+            self.inverse_mass[id(body)] = 1 / (body["w"] * body["h"])
+            self.awake[id(body)] = body
+
+    def release(self, body):
+        """
+        Lets a static box move, e.g. a plank that was knocked loose, and
+        wakes it up. The box may have been moved since it was added.
+
+        Parameters:
+            body (dict): The box.
+        """
+        self.grid.move(body, *bounds(body))
+        self.inverse_mass[id(body)] = 1 / (body["w"] * body["h"])
+        self.wake(body)
+
+    def remove(self, body):
+        """
+        Removes a destroyed box and wakes up the boxes resting on it.
+
+        Parameters:
+            body (dict): The box.
+        """
+        self.grid.remove(body)
+        self.inverse_mass.pop(id(body), None)
+        self.awake.pop(id(body), None)
+        self.wake(body)
+
+    def wake(self, body):
+        """
+        Wakes up a box and every sleeping box that rests on it, directly or
+        through other boxes, so that they start falling again.
+
+        Parameters:
+            body (dict): The box.
+        """
+        inverse_mass = self.inverse_mass
+        awake = self.awake
+        if id(body) in inverse_mass:
+            awake[id(body)] = body
+        queue = deque([body])
+        while queue:
+            body = queue.popleft()
+            top = body["y"] + body["h"]
+            for other in self.grid.query_box(body["x"], top - SLOP, body["w"], 2 * SLOP):
+                if (
+                    id(other) in inverse_mass
+                    and id(other) not in awake
+                    and abs(other["y"] - top) <= SLOP
+                    and overlap(body["x"], body["w"], other["x"], other["w"]) > self.side_slop
+                ):
+                    awake[id(other)] = other
+                    queue.append(other)
+
+    def clear(self):
+        """
+        Removes every box.
+        """
+        self.grid.clear()
+        self.inverse_mass.clear()
+        self.awake.clear()
+        self.impulses.clear()
+
+    def find_contacts(self, ticks):
+        """
+        Finds the contacts of the awake boxes for a step. Two boxes are in
+        contact if their sides overlap by more than side_slop, they overlap less
+        vertically than horizontally (otherwise they are side by side, unless
+        the solver separates them) and the gap between them can close during
+        the step.
+
+        Each contact is a list of the lower box (None for the ground), the
+        upper box, their inverse masses (0 for boxes that aren't awake), the
+        mass of the contact, the slowest allowed approach speed, the impulse
+        and the key of the contact in `impulses`. The contacts are sorted
+        from the bottom up.
+
+        Parameters:
+            ticks (float): Length of the step in ticks.
+
+        Returns:
+            list: The contacts.
+        """
+        awake = self.awake
+        ground = self.ground
+        pairs = {}
+        for body in awake.values():
+            reach = abs(body["vy"]) * ticks + SLOP
+            if body["y"] - ground <= reach:
+                pairs[(id(None), id(body))] = (None, body)
+
+            for other in self.grid.query_box(
+                body["x"], body["y"] - reach, body["w"], body["h"] + 2 * reach
+            ):
+                if other is body:
+                    continue
+                width = overlap(body["x"], body["w"], other["x"], other["w"])
+                if width <= self.side_slop:
+                    continue
+                if other["y"] + other["h"] / 2 <= body["y"] + body["h"] / 2:
+                    lower, upper = other, body
+                else:
+                    lower, upper = body, other
+                if (
+                    not self.separate
+                    and overlap(lower["y"], lower["h"], upper["y"], upper["h"]) > width
+                ):
+                    continue
+                gap = upper["y"] - lower["y"] - lower["h"]
+                if gap <= reach + abs(other["vy"]) * ticks:
+                    pairs.setdefault((id(lower), id(upper)), (lower, upper))
+
+        impulses = self.impulses
+        inverse_mass = self.inverse_mass
+        contacts = []
+        for key, (lower, upper) in pairs.items():
+            if lower is None:
+                top = ground
+                lower_mass = 0
+            else:
+                top = lower["y"] + lower["h"]
+                lower_mass = inverse_mass[id(lower)] if id(lower) in awake else 0
+            upper_mass = inverse_mass[id(upper)] if id(upper) in awake else 0
+            gap = upper["y"] - top
+            contacts.append([
+                lower,
+                upper,
+                lower_mass,
+                upper_mass,
+                1 / (lower_mass + upper_mass),
+                -max(gap, 0) / ticks,
+                impulses.get(key, 0),
+                key,
+                top if lower is not None else float("-inf")
+            ])
+        contacts.sort(key=lambda contact: contact[8])
+        return contacts
+
+    def solve(self, contacts):
+        """
+        Solves the velocities of the contacts with sequential impulses. The
+        impulse of each contact is accumulated over the iterations and never
+        pulls boxes together. The impulses the contacts start with (from the
+        last step) are applied first.
+
+        Parameters:
+            contacts (list): The contacts, see find_contacts.
+        """
+        for lower, upper, lower_mass, upper_mass, _, _, impulse, _, _ in contacts:
+            if impulse:
+                upper["vy"] += impulse * upper_mass
+                if lower_mass:
+                    lower["vy"] -= impulse * lower_mass
+
+        for _ in range(self.iterations):
+            for contact in contacts:
+                lower, upper, lower_mass, upper_mass, mass, bias, impulse, _, _ = contact
+                speed = upper["vy"] - lower["vy"] if lower_mass else upper["vy"]
+                new_impulse = max(impulse + (bias - speed) * mass, 0)
+                change = new_impulse - impulse
+                if change:
+                    upper["vy"] += change * upper_mass
+                    if lower_mass:
+                        lower["vy"] -= change * lower_mass
+                    contact[6] = new_impulse
+
+    def step(self, ticks=1):
+        """
+        Advances the boxes by one step.
+
+        Parameters:
+            ticks (float): Length of the step in ticks.
+
+        Returns:
+            list: The boxes that moved and their y-coordinates before the
+                  step, as (box, y) pairs.
+        """
+        awake = self.awake
+        if not awake:
+            return []
+
+        start = [(body, body["y"]) for body in awake.values()]
+        for body, _ in start:
+            body["vy"] -= self.gravity * ticks
+
+        contacts = self.find_contacts(ticks)
+        self.solve(contacts)
+        self.impulses = {contact[7]: contact[6] for contact in contacts}
+
+        for body, _ in start:
+            body["y"] += body["vy"] * ticks
+
+        # Boxes that sank into the box under them are put back on top of it
+        # and stop moving into it, from the bottom up so that a whole stack
+        # is fixed in one pass
+        ground = self.ground
+        for lower, upper, lower_mass, upper_mass, _, _, _, _, _ in contacts:
+            top = ground if lower is None else lower["y"] + lower["h"]
+            if upper["y"] < top:
+                lower_speed = 0 if lower is None else lower["vy"]
+                if upper_mass:
+                    upper["y"] = top
+                    upper["vy"] = max(upper["vy"], lower_speed)
+                elif lower_mass:
+                    lower["y"] = upper["y"] - lower["h"]
+                    lower["vy"] = min(lower_speed, upper["vy"])
+
+        moves = []
+        for body, start_y in start:
+            if body["y"] < ground:
+                body["y"] = ground
+                body["vy"] = max(body["vy"], 0)
+            if body["y"] != start_y:
+                moves.append((body, start_y))
+                self.grid.move(body, *bounds(body))
+
+        # Boxes held up by something that doesn't move are put to sleep,
+        # again from the bottom up so that a resting stack sleeps at once
+        for lower, upper, _, _, _, _, _, _, _ in contacts:
+            if (
+                id(upper) in awake
+                and abs(upper["vy"]) <= SLEEP_SPEED
+                and (lower is None or id(lower) not in awake)
+                and upper["y"] - (ground if lower is None else lower["y"] + lower["h"]) <= SLOP
+            ):
+                upper["vy"] = 0
+                del awake[id(upper)]
+        return moves
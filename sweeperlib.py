@@ -27,6 +27,7 @@ if modifiers & sweeperlib.MOD_SHIFT:
     # somethinghappens
 """
 
+import os
 import pyglet
 # If the sweeperlib crashes while loading, you can try to uncomment these lines.
 #from pyglet.gl import glEnable, GL_TEXTURE_2D
@@ -52,18 +53,40 @@ graphics = {
     "batch": pyglet.graphics.Batch(),
     "bg_group": pyglet.graphics.Group(0),
     "fg_group": pyglet.graphics.Group(1),
-    "text_group": pyglet.graphics.Group(2),
+    "actor_group": pyglet.graphics.Group(2),
+    "overlay_group": pyglet.graphics.Group(3),
+    "text_group": pyglet.graphics.Group(4),
     "sprites": [],
-    "images": {}
+    "scene": {},
+    "overlay": {
+        "key": None,
+        "shapes": []
+    },
+    "labels": {},
+    "used_labels": set(),
+    "free_labels": [],
+    "images": {},
+    "atlas": pyglet.image.atlas.TextureBin(),
+    "image_cache": {},
+    "image_stats": {
+        "hits": 0,
+        "misses": 0
+    }
 }
 
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif")
+MAX_FREE_LABELS = 32
+
 handlers = {
     "timeouts": [],
+    "drag": None
 }
 
 state = {
     "keys": pyglet.window.key.KeyStateHandler(),
-    "notified": False
+    "notified": False,
+    "drag": None,
+    "coalescing": False
 }
 
 
@@ -107,11 +130,8 @@ def load_duck(path):
     :param str path: path to the sprites folder
     """
 
-    pyglet.resource.path = [path]
-    duck = pyglet.resource.image("duck.png")
-    sling = pyglet.resource.image("sling.png")
-    graphics["images"]["duck"] = duck
-    graphics["images"]["sling"] = sling
+    graphics["images"]["duck"] = load_image(path, "duck.png")
+    graphics["images"]["sling"] = load_image(path, "sling.png")
 
 def load_background_image(folder, image):
     """
@@ -120,12 +140,82 @@ def load_background_image(folder, image):
     plethora of attributes but for the purposes of the project only two are
     needed: width and height. These can be used to get the image's dimensions.
 
+    The image is fetched through the image cache (see load_image), so calling
+    this repeatedly for the same image is cheap.
+
+    :param str folder: path to the folder containing the image
+    :param str image: name of the image in the folder
+    """
+
+    return load_image(folder, image)
+
+def load_image(folder, image):
+    """
+    Returns an image from the image cache, loading it first if it hasn't been
+    loaded yet. Images are cached by folder and name, and loaded images are
+    packed into a shared texture atlas. Each folder is added to Pyglet's
+    resource path only once, so looking images up doesn't get slower no
+    matter how many times this is called.
+
     :param str folder: path to the folder containing the image
     :param str image: name of the image in the folder
+    :return: image object
+    """
+
+    key = (folder, image)
+    cached = graphics["image_cache"].get(key)
+    if cached is not None:
+        graphics["image_stats"]["hits"] += 1
+        return cached
+
+    graphics["image_stats"]["misses"] += 1
+    if folder not in pyglet.resource.path:
+        pyglet.resource.path.append(folder)
+        pyglet.resource.reindex()
+
+    file = pyglet.resource.file(image)
+    try:
+        loaded = pyglet.image.load(image, file=file)
+    finally:
+        file.close()
+
+    try:
+        texture = graphics["atlas"].add(loaded, border=1)
+    except pyglet.image.atlas.AllocatorException:
+        texture = loaded.get_texture()
+    graphics["image_cache"][key] = texture
+    return texture
+
+def preload_images(folder):
+    """
+    Loads every image in a folder into the image cache. Call this at startup
+    so that the game never has to load images from disk while it's running.
+
+    :param str folder: path to the folder containing the images
+    """
+
+    path = folder
+    if not os.path.isabs(path):
+        path = os.path.join(pyglet.resource.get_script_home(), folder)
+
+    for name in sorted(os.listdir(path)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            load_image(folder, name)
+
+def image_cache_stats():
     """
+    Returns the image cache's statistics as a dictionary with the number of
+    cache hits, misses, and cached images. Useful for checking that the game
+    isn't loading images again while it's running.
 
-    pyglet.resource.path.append(folder)
-    return pyglet.resource.image(image)
+    :return: dictionary of cache statistics
+    """
+
+    return {
+        "hits": graphics["image_stats"]["hits"],
+        "misses": graphics["image_stats"]["misses"],
+        "images": len(graphics["image_cache"])
+    }
 
 
 def create_window(width=800, height=600, bg_color=(240, 240, 240, 255), bg_image=None):
@@ -166,18 +256,17 @@ def resize_window(width, height, bg_color=(240, 240, 240, 255), bg_image=None):
     """
 
     graphics["window"].set_size(width, height)
-    if bg_image:
+    if not bg_image:
+        bg_image = pyglet.image.SolidColorImagePattern(bg_color).create_image(width, height)
+
+    if graphics["background"] is None:
         graphics["background"] = pyglet.sprite.Sprite(
             bg_image, 0, 0,
             batch=graphics["batch"],
             group=graphics["bg_group"]
         )
     else:
-        graphics["background"] = pyglet.sprite.Sprite(
-            pyglet.image.SolidColorImagePattern(bg_color).create_image(width, height),
-            batch=graphics["batch"],
-            group=graphics["bg_group"]
-        )
+        graphics["background"].image = bg_image
 
 
 def set_mouse_handler(handler):
@@ -210,7 +299,7 @@ def set_mouse_handler(handler):
     else:
         print("Window hasn't been created!")
 
-def set_drag_handler(handler):
+def set_drag_handler(handler, coalesce=False):
     """
     Sets a function that is used to handle mouse dragging. It is called
     periodically when the mouse cursor is moved while one of its buttons is
@@ -233,13 +322,79 @@ def set_drag_handler(handler):
 
     This way your program can receive mouse drag events from Pyglet.
 
+    Mice with a high polling rate can send many more drag events than there
+    are frames. With coalesce set to True, the events are collected and the
+    handler is called at most once per frame, with the latest position and
+    the sum of the changes. Collected events are always handed over before
+    a mouse press, mouse release or key press is, so the handlers see the
+    events in the order they happened.
+
     :param function handler: handler function for mouse clicks
+    :param bool coalesce: combine the drag events of a frame into one
     """
 
-    if graphics["window"]:
+    if not graphics["window"]:
+        print("Window hasn't been created!")
+        return
+
+    handlers["drag"] = handler
+    if not coalesce:
         graphics["window"].on_mouse_drag = handler
+        return
+
+    graphics["window"].on_mouse_drag = queue_drag
+    if not state["coalescing"]:
+        state["coalescing"] = True
+        # Handlers pushed on the window are called before the ones set as
+        # its attributes
+        graphics["window"].push_handlers(
+            on_mouse_press=flush_drag,
+            on_mouse_release=flush_drag,
+            on_key_press=flush_drag
+        )
+        pyglet.clock.schedule(flush_drag)
+        handlers["timeouts"].append(flush_drag)
+
+def queue_drag(x, y, dx, dy, button, modifiers):
+    """
+    Collects a drag event to be handed to the drag handler by flush_drag.
+    The latest position is kept and the changes are summed. If the button
+    or modifier keys change, the collected events are handed over first.
+    Used as the window's drag handler when drag events are coalesced (see
+    set_drag_handler).
+
+    :param int x: cursor's x coordinate
+    :param int y: cursor's y coordinate
+    :param int dx: change of the x coordinate
+    :param int dy: change of the y coordinate
+    :param int button: the button held down
+    :param int modifiers: modifier keys held down
+    """
+
+    pending = state["drag"]
+    if pending is not None and (pending[4] != button or pending[5] != modifiers):
+        flush_drag()
+        pending = None
+    if pending is None:
+        state["drag"] = [x, y, dx, dy, button, modifiers]
     else:
-        print("Window hasn't been created!")
+        pending[0] = x
+        pending[1] = y
+        pending[2] += dx
+        pending[3] += dy
+
+def flush_drag(*args):
+    """
+    Hands the drag events collected by queue_drag to the drag handler as one
+    event. Called once per frame and before other mouse and keyboard events;
+    the arguments of those calls are ignored. Does nothing if no drag events
+    have been collected.
+    """
+
+    pending = state["drag"]
+    if pending is not None:
+        state["drag"] = None
+        handlers["drag"](*pending)
     
 def set_release_handler(handler):
     """
@@ -382,10 +537,13 @@ def close():
 
 def clear_window():
     """
-    Clears away everything from the window.
+    Clears away everything from the window. Also recycles the labels of
+    draw_text that weren't used since the previous call, so call this at the
+    start of every frame.
     """
 
     graphics["window"].clear()
+    recycle_labels()
 
 
 def draw_background():
@@ -405,6 +563,10 @@ def draw_text(text, x, y, color=(0, 0, 0, 255), font="arial", size=32):
     of the text.
     
     Text, if any, should be drawn last.
+
+    Text drawn at the same position with the same font and size reuses the
+    same label, and the text is only laid out again when it changes. Calling
+    this every frame with e.g. a counter is therefore cheap.
     
     :param str text: string to display
     :param int x: bottom left x coordinate for the text
@@ -414,16 +576,110 @@ def draw_text(text, x, y, color=(0, 0, 0, 255), font="arial", size=32):
     :param int size: fontin size as points
     """
 
-    text_box = pyglet.text.Label(text,
-        font_name=font,
-        font_size=size,
-        color=color,
-        x=x, y=y,
-        anchor_x="left", anchor_y="bottom",
+    key = (x, y, font, size)
+    graphics["used_labels"].add(key)
+    text_box = graphics["labels"].get(key)
+    if text_box is None and graphics["free_labels"]:
+        text_box = graphics["free_labels"].pop()
+        text_box.begin_update()
+        text_box.text = text
+        text_box.font_name = font
+        text_box.font_size = size
+        text_box.color = color
+        text_box.position = (x, y, 0)
+        text_box.end_update()
+        graphics["labels"][key] = text_box
+    elif text_box is None:
+        text_box = pyglet.text.Label(text,
+            font_name=font,
+            font_size=size,
+            color=color,
+            x=x, y=y,
+            anchor_x="left", anchor_y="bottom"
+        )
+        graphics["labels"][key] = text_box
+    else:
+        if text_box.text != text:
+            text_box.text = text
+        if tuple(text_box.color) != tuple(color):
+            text_box.color = color
+    text_box.draw()
+
+def recycle_labels():
+    """
+    Moves the labels of draw_text that haven't been used since the last call
+    to a pool of free labels, to be reused for new text. Labels that don't
+    fit in the pool are deleted, so the number of labels stays bounded even
+    if text is drawn in a different place on every frame. Called by
+    clear_window.
+    """
+
+    labels = graphics["labels"]
+    for key in [key for key in labels if key not in graphics["used_labels"]]:
+        text_box = labels.pop(key)
+        if len(graphics["free_labels"]) < MAX_FREE_LABELS:
+            graphics["free_labels"].append(text_box)
+        else:
+            text_box.delete()
+    graphics["used_labels"].clear()
+
+def show_overlay(key, box, lines, font="arial", color=(255, 255, 255, 255)):
+    """
+    Shows a text overlay, e.g. a menu or a game over screen, consisting of a
+    box and lines of text centered on the given coordinates. The overlay is
+    added to the batch and drawn by draw_sprites. It is only built when the
+    key changes, so this can be called on every frame without the text being
+    laid out again. Showing a different key replaces the previous overlay.
+
+    The box is a dictionary with the keys x, y (bottom left corner), width,
+    height, color (RGB) and opacity. Each line is a dictionary with the keys
+    text, font_size, x and y.
+
+    :param object key: key that identifies the overlay's contents
+    :param dict box: the background box of the overlay
+    :param list lines: lines of text to show on the box
+    :param str font: name of the font family
+    :param tuple color: text color, a tuple of four integers (RGBA)
+    """
+
+    overlay = graphics["overlay"]
+    if overlay["key"] == key:
+        return
+
+    clear_overlay()
+    overlay["key"] = key
+    rectangle = pyglet.shapes.Rectangle(
+        box["x"], box["y"], box["width"], box["height"],
+        color=box["color"],
         batch=graphics["batch"],
-        group=graphics["text_group"]
+        group=graphics["overlay_group"]
     )
-    text_box.draw()
+    rectangle.opacity = box["opacity"]
+    overlay["shapes"].append(rectangle)
+    for line in lines:
+        overlay["shapes"].append(pyglet.text.Label(
+            line["text"],
+            font_name=font,
+            font_size=line["font_size"],
+            x=line["x"],
+            y=line["y"],
+            anchor_x="center",
+            anchor_y="center",
+            color=color,
+            batch=graphics["batch"],
+            group=graphics["text_group"]
+        ))
+
+def clear_overlay():
+    """
+    Removes the overlay shown with show_overlay, if any.
+    """
+
+    overlay = graphics["overlay"]
+    for shape in overlay["shapes"]:
+        shape.delete()
+    overlay["shapes"].clear()
+    overlay["key"] = None
 
 def begin_sprite_draw():
     """
@@ -480,15 +736,96 @@ def prepare_rectangle(x, y, width, height, color):
         group=graphics["fg_group"]
     ))
 
+def place_sprite(key, image, x, y, scale=1, rotation=0, group="fg_group"):
+    """
+    Adds a persistent sprite to the scene, or moves it if a sprite with the
+    same key has already been placed. Unlike sprites added with prepare_sprite,
+    scene sprites stay in the batch between frames, so each game object only
+    needs one sprite for its whole lifetime. Placing a sprite again at the same
+    position costs next to nothing. The key can be any hashable value that
+    identifies the object, e.g. its id.
+
+    :param object key: key that identifies the sprite in the scene
+    :param object image: image object, as returned by load_background_image
+    :param float x: bottom left x coordinate
+    :param float y: bottom left y coordinate
+    :param float scale: scale of the sprite, used only when it is created
+    :param float rotation: rotation in degrees, used only when it is created
+    :param str group: name of the drawing group (fg_group or actor_group)
+    :return: the placed sprite
+    """
+
+    sprite = graphics["scene"].get(key)
+    if sprite is None:
+        sprite = pyglet.sprite.Sprite(
+            image, x, y,
+            batch=graphics["batch"],
+            group=graphics[group]
+        )
+        sprite.scale = scale
+        sprite.rotation = rotation
+        graphics["scene"][key] = sprite
+    elif sprite.x != x or sprite.y != y:
+        sprite.position = (x, y, sprite.z)
+    return sprite
+
+def remove_sprite(key):
+    """
+    Removes a sprite from the scene. Call this when the object the sprite
+    belongs to is destroyed. Removing a key that isn't in the scene does
+    nothing.
+
+    :param object key: key that identifies the sprite in the scene
+    """
+
+    sprite = graphics["scene"].pop(key, None)
+    if sprite is not None:
+        sprite.delete()
+
+def clear_scene():
+    """
+    Removes all sprites from the scene, e.g. when a new level is loaded or
+    the game returns to a menu.
+    """
+
+    for sprite in graphics["scene"].values():
+        sprite.delete()
+    graphics["scene"].clear()
+
 def draw_sprites():
     """
     Draws all prepared sprites from the batch in one go. Call this function
-    when you have prepared all sprites to be drawn.
+    when you have prepared all sprites to be drawn. Sprites and rectangles
+    added with prepare_sprite and prepare_rectangle are removed from the
+    batch afterwards; scene sprites and overlays stay.
     """
 
     graphics["batch"].draw()
+    for sprite in graphics["sprites"]:
+        sprite.delete()
     graphics["sprites"].clear()
 
+def count_batch_objects():
+    """
+    Returns the number of live drawable objects owned by this module as a
+    dictionary, with a total. Meant for debugging: if the total keeps growing
+    while the game runs, something is being added to the batch and never
+    removed.
+
+    :return: dictionary of object counts
+    """
+
+    counts = {
+        "background": int(graphics["background"] is not None),
+        "prepared": len(graphics["sprites"]),
+        "scene": len(graphics["scene"]),
+        "overlay": len(graphics["overlay"]["shapes"]),
+        "labels": len(graphics["labels"]),
+        "free_labels": len(graphics["free_labels"])
+    }
+    counts["total"] = sum(counts.values())
+    return counts
+
 if __name__ == "__main__":
     # Disabling two pylint warnings because it would complain about the test
     # code despite it being perfectly valid.
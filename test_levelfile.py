@@ -0,0 +1,54 @@
+"""
+Tests for the binary level files of levelfile. Run with:
+
+    python -m pytest test_levelfile.py
+"""
+
+import json
+import pytest
+import levelfile
+
+def test_json_levels_round_trip():
+    for path in ("level1.json", "level2.json"):
+        with open(path) as file:
+            data = json.load(file)
+        assert levelfile.unpack_level(levelfile.pack_level(data)) == data
+
+def test_fractional_coordinates_round_trip_exactly():
+    data = {
+        "obstacles": [
+            {"type": "horizontal", "block": "a", "x": 340.1, "y": 85.3, "w": 17, "h": 53,
+             "falling": False, "vy": -0.1}
+        ],
+        "targets": [{"x": 1 / 3, "y": 123456.789, "w": 46, "h": 46, "vy": 0}],
+        "ducks": 3,
+        "next_level": "level2.json",
+        "obstacle_type": "breakable"
+    }
+    assert levelfile.unpack_level(levelfile.pack_level(data)) == data
+
+def test_large_levels_are_mapped_and_read_back(tmp_path):
+    data = {
+        "obstacles": [{"x": i + 0.5, "y": i / 7, "w": 25, "h": 26, "vy": 0} for i in range(4000)],
+        "targets": [],
+        "ducks": 3,
+        "next_level": None
+    }
+    path = str(tmp_path / "level1.lvl")
+    levelfile.save(path, data)
+    assert len(levelfile.pack_level(data)) > levelfile.MMAP_THRESHOLD
+    assert levelfile.load(path) == data
+
+def test_truncated_files_are_rejected(tmp_path):
+    data = {
+        "obstacles": [{"x": i, "y": 0, "w": 25, "h": 26, "vy": 0} for i in range(4000)],
+        "targets": [],
+        "ducks": 3,
+        "next_level": "level2.json"
+    }
+    packed = levelfile.pack_level(data)
+    path = tmp_path / "level1.lvl"
+    for length in (5, levelfile.HEADER.size + 3, len(packed) // 2, len(packed) - 1):
+        path.write_bytes(packed[:length])
+        with pytest.raises(ValueError):
+            levelfile.load(str(path))
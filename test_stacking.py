@@ -0,0 +1,47 @@
+"""
+Tests for stacking.StackSolver. Run with:
+
+    python -m pytest test_stacking.py
+"""
+
+import stacking
+
+GROUND = 85
+GRAVITY = 0.5
+
+def box(x, y, w=25, h=26):
+    return {"x": x, "y": y, "w": w, "h": h, "vy": 0}
+
+def settle(solver, ticks=300):
+    for _ in range(ticks):
+        solver.step()
+
+def test_separated_boxes_overlapping_by_two_pixels_stack():
+    lower = box(340, GROUND)
+    upper = box(340 + 25 - 2, GROUND + 100)
+    solver = stacking.StackSolver(GROUND, GRAVITY, separate=True)
+    solver.add(lower)
+    solver.add(upper)
+    settle(solver)
+    assert lower["y"] == GROUND
+    assert upper["y"] == GROUND + lower["h"]
+    assert not solver.awake
+
+def test_separated_boxes_sunk_into_each_other_are_pushed_apart():
+    lower = box(340, GROUND)
+    upper = box(340 + 25 - 2, GROUND + 10)
+    solver = stacking.StackSolver(GROUND, GRAVITY, separate=True)
+    solver.add(lower)
+    solver.add(upper)
+    settle(solver)
+    assert upper["y"] == GROUND + lower["h"]
+
+def test_planks_overlapping_within_slop_stand_side_by_side():
+    left = box(340, GROUND)
+    right = box(340 + 25 - 2, GROUND + 100)
+    solver = stacking.StackSolver(GROUND, GRAVITY)
+    solver.add(left)
+    solver.add(right)
+    settle(solver)
+    assert left["y"] == GROUND
+    assert right["y"] == GROUND